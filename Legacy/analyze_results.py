@@ -0,0 +1,238 @@
+import json
+import re
+import logging
+from datetime import datetime
+
+from atomic_io import write_json_atomic
+
+STATUS_UNKNOWN = 0
+STATUS_LOW = 1
+STATUS_NORMAL = 2
+STATUS_HIGH = 3
+STATUS_LABELS = ["unknown", "low", "normal", "high"]
+
+DEFAULT_WINDOW = 3
+
+
+def parse_value(result_str):
+    """Numeric value of a result string ("5,2", "< 0.1", "12+") or None."""
+    if not result_str:
+        return None
+    match = re.search(r'[-+]?\d+(?:[.,]\d+)?', result_str)
+    if not match:
+        return None
+    try:
+        return float(match.group(0).replace(",", "."))
+    except ValueError:
+        return None
+
+
+def document_date(metadata):
+    """First date of a manifest record ("2023.03.31. - 2023.04.03.") as YYYY-MM-DD."""
+    if metadata.get("date_start"):
+        return metadata["date_start"]
+    date_text = metadata.get("date") or ""
+    match = re.search(r'(\d{4})\.(\d{2})\.(\d{2})', date_text)
+    if match:
+        return "-".join(match.groups())
+    last_modified = metadata.get("lastModified")
+    if last_modified:
+        return last_modified[:10]
+    return None
+
+
+def flatten_results(all_data):
+    """Turns extractor output into one row per result.
+
+    Only this step walks the documents in Python; everything downstream
+    runs on the column arrays.
+    """
+    rows = []
+    for doc_idx, doc in enumerate(all_data):
+        date = document_date(doc.get("metadata", {}))
+        for res_idx, entry in enumerate(doc.get("results", [])):
+            rows.append((
+                entry.get("test_name", ""),
+                date or "",
+                parse_value(entry.get("result")),
+                entry.get("ref_min"),
+                entry.get("ref_max"),
+                doc_idx,
+                res_idx,
+            ))
+    return rows
+
+
+def evaluate(series, dates, values, ref_min, ref_max, window=DEFAULT_WINDOW):
+    """Vectorized status, deltas, rolling statistics and alerts.
+
+    series: per-row test key, dates: ISO date strings (sortable),
+    values/ref_min/ref_max: floats with NaN for missing. Returns a dict
+    of arrays aligned with the input rows.
+    """
+    import numpy as np
+
+    series = np.asarray(series, dtype=object)
+    dates = np.asarray(dates, dtype="U10")
+    values = np.asarray(values, dtype=float)
+    ref_min = np.asarray(ref_min, dtype=float)
+    ref_max = np.asarray(ref_max, dtype=float)
+    n = len(values)
+
+    status = np.full(n, STATUS_UNKNOWN, dtype=np.int8)
+    has_value = ~np.isnan(values)
+    has_range = ~np.isnan(ref_min) | ~np.isnan(ref_max)
+    low = has_value & (values < np.where(np.isnan(ref_min), -np.inf, ref_min))
+    high = has_value & (values > np.where(np.isnan(ref_max), np.inf, ref_max))
+    status[has_value & has_range] = STATUS_NORMAL
+    status[low] = STATUS_LOW
+    status[high] = STATUS_HIGH
+
+    out = {
+        "status": status,
+        "delta": np.full(n, np.nan),
+        "rolling_mean": np.full(n, np.nan),
+        "rolling_std": np.full(n, np.nan),
+        "newly_out_of_range": np.zeros(n, dtype=bool),
+        "series_id": np.zeros(n, dtype=np.int64),
+    }
+    if n == 0:
+        return out
+
+    # Chronological order inside each test series; rows without a numeric
+    # value are kept out of the running statistics.
+    series_keys, series_id = np.unique(series.astype(str), return_inverse=True)
+    out["series_id"] = series_id
+    order = np.lexsort((dates, series_id))
+    order = order[has_value[order]]
+    if len(order) == 0:
+        return out
+
+    sid = series_id[order]
+    vals = values[order]
+    stat = status[order]
+    m = len(order)
+
+    starts = np.ones(m, dtype=bool)
+    starts[1:] = sid[1:] != sid[:-1]
+    group_start = np.maximum.accumulate(np.where(starts, np.arange(m), 0))
+
+    delta = np.full(m, np.nan)
+    delta[1:] = vals[1:] - vals[:-1]
+    delta[starts] = np.nan
+
+    # Trailing windows as an (m, window) matrix: column k is the value k
+    # rows back, masked where that crosses into the previous series. The
+    # variance is taken over deviations from each window's own mean, so
+    # it doesn't lose precision the way whole-array cumulative sums do.
+    idx = np.arange(m)
+    back = idx[:, None] - np.arange(window)[None, :]
+    in_window = back >= group_start[:, None]
+    windows = np.where(in_window, vals[np.maximum(back, 0)], 0.0)
+    count = in_window.sum(axis=1)
+    mean = windows.sum(axis=1) / count
+    centred = np.where(in_window, windows - mean[:, None], 0.0)
+    std = np.sqrt((centred * centred).sum(axis=1) / count)
+
+    out_of_range = (stat == STATUS_LOW) | (stat == STATUS_HIGH)
+    prev_in_range = np.zeros(m, dtype=bool)
+    prev_in_range[1:] = stat[:-1] == STATUS_NORMAL
+    newly = out_of_range & prev_in_range & ~starts
+
+    out["delta"][order] = delta
+    out["rolling_mean"][order] = mean
+    out["rolling_std"][order] = std
+    out["newly_out_of_range"][order] = newly
+    out["series_keys"] = series_keys
+    return out
+
+
+def _column(rows, i):
+    return [r[i] if r[i] is not None else float("nan") for r in rows]
+
+
+def analyze(all_data, window=DEFAULT_WINDOW, annotate=True):
+    """Runs the analytics stage over extractor output.
+
+    With annotate=True each result entry also gets a "status" field
+    (low/normal/high/unknown) so downstream consumers don't have to
+    re-evaluate ref_min/ref_max themselves.
+    """
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        logging.error("numpy not installed. Please install it using: pip install numpy")
+        return None
+
+    rows = flatten_results(all_data)
+    res = evaluate(
+        [r[0] for r in rows],
+        [r[1] for r in rows],
+        _column(rows, 2),
+        _column(rows, 3),
+        _column(rows, 4),
+        window=window,
+    )
+
+    if annotate:
+        for r, code in zip(rows, res["status"].tolist()):
+            all_data[r[5]]["results"][r[6]]["status"] = STATUS_LABELS[code]
+
+    return build_report(rows, res, window)
+
+
+def build_report(rows, res, window=DEFAULT_WINDOW):
+    """Groups the evaluated arrays into a JSON-serializable summary."""
+    import numpy as np
+
+    def _num(x):
+        return None if np.isnan(x) else round(float(x), 4)
+
+    tests = {}
+    alerts = []
+    if len(rows) == 0:
+        return {"generated": datetime.now().isoformat(), "window": window, "tests": tests, "alerts": alerts}
+
+    order = np.lexsort((np.asarray([r[1] for r in rows], dtype="U10"), res["series_id"]))
+    for i in order.tolist():
+        name, date, value = rows[i][0], rows[i][1], rows[i][2]
+        if value is None:
+            continue
+        point = {
+            "date": date or None,
+            "value": value,
+            "status": STATUS_LABELS[int(res["status"][i])],
+            "delta": _num(res["delta"][i]),
+            "rolling_mean": _num(res["rolling_mean"][i]),
+            "rolling_std": _num(res["rolling_std"][i]),
+        }
+        tests.setdefault(name, []).append(point)
+        if res["newly_out_of_range"][i]:
+            alerts.append({"test_name": name, **point})
+
+    counts = np.bincount(res["status"], minlength=len(STATUS_LABELS))
+    return {
+        "generated": datetime.now().isoformat(),
+        "window": window,
+        "status_counts": {label: int(c) for label, c in zip(STATUS_LABELS, counts)},
+        "tests": tests,
+        "alerts": alerts,
+    }
+
+
+def save_report(report, output_path="blood_analytics.json"):
+    write_json_atomic(output_path, report)
+    logging.info(f"Generated {output_path}")
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "blood_results.json"
+    with open(input_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    report = analyze(data, annotate=False)
+    if report is not None:
+        save_report(report)
+        for alert in report["alerts"]:
+            logging.info(f"Newly out of range: {alert['test_name']} {alert['value']} on {alert['date']} ({alert['status']})")
@@ -0,0 +1,258 @@
+import io
+import os
+import sys
+import json
+import mmap
+import logging
+import argparse
+
+from atomic_io import write_json_atomic
+
+# Optional packed storage for EESZT_Archive. Instead of one loose file per
+# document, PDFs are appended to a few large pack files inside the archive
+# directory, with pack-index.json mapping content hash -> (pack, offset,
+# length) and file name -> hash:
+#
+#   EESZT_Archive/pack-00000.pack
+#   EESZT_Archive/pack-index.json
+#
+# Manifest paths ("./EESZT_Archive/<name>.pdf") stay valid: open_document()
+# serves a loose file if it exists and otherwise a slice of the
+# memory-mapped pack, without extracting it.
+
+INDEX_NAME = "pack-index.json"
+PACK_PATTERN = "pack-{:05d}.pack"
+MAX_PACK_BYTES = 1 << 30
+
+_packs = {}
+
+
+class SliceReader(io.RawIOBase):
+    """Seekable read-only file object over a memoryview (no upfront copy)."""
+
+    def __init__(self, view, name=None):
+        self._view = view
+        self._pos = 0
+        self.name = name
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = max(0, min(len(buffer), len(self._view) - self._pos))
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+class PackedArchive:
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self.index_path = os.path.join(archive_dir, INDEX_NAME)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        else:
+            self.index = {"documents": {}, "names": {}}
+        self._maps = {}
+
+    @staticmethod
+    def exists(archive_dir):
+        return os.path.exists(os.path.join(archive_dir, INDEX_NAME))
+
+    def names(self):
+        return sorted(self.index["names"])
+
+    def __contains__(self, name):
+        return name in self.index["names"]
+
+    def sha256(self, name):
+        return self.index["names"][name]
+
+    def size(self, name):
+        return self.index["documents"][self.sha256(name)]["length"]
+
+    def _map(self, pack_name):
+        if pack_name not in self._maps:
+            with open(os.path.join(self.archive_dir, pack_name), 'rb') as f:
+                self._maps[pack_name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[pack_name]
+
+    def view(self, name):
+        """Zero-copy memoryview of one document's bytes."""
+        entry = self.index["documents"][self.sha256(name)]
+        mm = self._map(entry["pack"])
+        return memoryview(mm)[entry["offset"]:entry["offset"] + entry["length"]]
+
+    def open(self, name):
+        return SliceReader(self.view(name), name=os.path.join(self.archive_dir, name))
+
+    def _current_pack(self, incoming):
+        packs = sorted({e["pack"] for e in self.index["documents"].values()})
+        if packs:
+            last = os.path.join(self.archive_dir, packs[-1])
+            if os.path.getsize(last) + incoming <= MAX_PACK_BYTES:
+                return packs[-1]
+        return PACK_PATTERN.format(len(packs))
+
+    def add(self, name, data):
+        """Appends data unless identical content is already packed."""
+        import hashlib
+
+        sha = hashlib.sha256(data).hexdigest()
+        if sha not in self.index["documents"]:
+            pack_name = self._current_pack(len(data))
+            pack_path = os.path.join(self.archive_dir, pack_name)
+            with open(pack_path, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+            self._maps.pop(pack_name, None)
+            self.index["documents"][sha] = {"pack": pack_name, "offset": offset, "length": len(data)}
+        self.index["names"][name] = sha
+        return sha
+
+    def save(self):
+        write_json_atomic(self.index_path, self.index)
+
+
+def packed_archive(archive_dir):
+    """The PackedArchive for a directory (cached per process), or None.
+
+    Reloaded when pack-index.json changes, so long-running processes
+    (watch mode, the service) see documents packed after they started.
+    """
+    archive_dir = os.path.abspath(archive_dir)
+    try:
+        st = os.stat(os.path.join(archive_dir, INDEX_NAME))
+        stamp = (st.st_size, st.st_mtime_ns)
+    except FileNotFoundError:
+        stamp = None
+    cached = _packs.get(archive_dir)
+    if cached is None or cached[0] != stamp:
+        cached = _packs[archive_dir] = (stamp, PackedArchive(archive_dir) if stamp else None)
+    return cached[1]
+
+
+def list_documents(archive_dir, suffix=".pdf"):
+    """File names of loose and packed documents (replaces os.listdir)."""
+    names = {f for f in os.listdir(archive_dir) if f.lower().endswith(suffix)}
+    pack = packed_archive(archive_dir)
+    if pack:
+        names.update(n for n in pack.names() if n.lower().endswith(suffix))
+    return sorted(names)
+
+
+def document_exists(path):
+    if os.path.exists(path):
+        return True
+    pack = packed_archive(os.path.dirname(path) or ".")
+    return bool(pack) and os.path.basename(path) in pack
+
+
+def open_document(path):
+    """A loose path as-is, or a seekable stream over the packed bytes."""
+    if hasattr(path, "read"):
+        return path  # already a stream, e.g. uploaded bytes
+    if os.path.exists(path):
+        return path
+    pack = packed_archive(os.path.dirname(path) or ".")
+    name = os.path.basename(path)
+    if pack and name in pack:
+        return pack.open(name)
+    raise FileNotFoundError(path)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    import hashlib
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def document_sha256(path):
+    """Content hash; free for packed documents since it is their key."""
+    if not os.path.exists(path):
+        pack = packed_archive(os.path.dirname(path) or ".")
+        if pack and os.path.basename(path) in pack:
+            return pack.sha256(os.path.basename(path))
+    return file_sha256(path)
+
+
+def pack_archive(archive_dir, remove_loose=False):
+    pack = PackedArchive(archive_dir)
+    loose = sorted(f for f in os.listdir(archive_dir) if f.lower().endswith(".pdf"))
+    for name in loose:
+        with open(os.path.join(archive_dir, name), 'rb') as f:
+            pack.add(name, f.read())
+    pack.save()
+    # Loose copies are only removed once the index is safely on disk.
+    if remove_loose:
+        for name in loose:
+            os.unlink(os.path.join(archive_dir, name))
+    _packs.pop(os.path.abspath(archive_dir), None)
+    logging.info(f"Packed {len(loose)} files into {archive_dir} ({len(pack.index['documents'])} unique documents)")
+
+
+def unpack_archive(archive_dir, output_dir=None):
+    output_dir = output_dir or archive_dir
+    pack = PackedArchive(archive_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    count = 0
+    for name in pack.names():
+        target = os.path.join(output_dir, name)
+        if os.path.exists(target):
+            continue
+        with open(target, 'wb') as f:
+            f.write(pack.view(name))
+        count += 1
+    logging.info(f"Unpacked {count} files into {output_dir}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack EESZT_Archive PDFs into append-only pack files.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_pack = sub.add_parser("pack", help="Append loose PDFs to the packs")
+    p_pack.add_argument("archive_dir", nargs="?", default="EESZT_Archive")
+    p_pack.add_argument("--remove-loose", action="store_true", help="Delete loose files once packed")
+    p_unpack = sub.add_parser("unpack", help="Write packed documents back out as loose files")
+    p_unpack.add_argument("archive_dir", nargs="?", default="EESZT_Archive")
+    p_unpack.add_argument("--output-dir")
+    p_list = sub.add_parser("list", help="List packed documents")
+    p_list.add_argument("archive_dir", nargs="?", default="EESZT_Archive")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.archive_dir):
+        logging.error(f"Archive directory not found: {args.archive_dir}")
+        sys.exit(1)
+    if args.command == "pack":
+        pack_archive(args.archive_dir, args.remove_loose)
+    elif args.command == "unpack":
+        unpack_archive(args.archive_dir, args.output_dir)
+    else:
+        pack = PackedArchive(args.archive_dir)
+        for name in pack.names():
+            print(f"{pack.size(name):>10}  {pack.sha256(name)[:12]}  {name}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    main()
@@ -0,0 +1,45 @@
+import os
+import json
+
+_umask = None
+
+
+def _new_file_mode():
+    """0o666 minus the process umask (read once; os.umask can only be read by setting it)."""
+    global _umask
+    if _umask is None:
+        _umask = os.umask(0o022)
+        os.umask(_umask)
+    return 0o666 & ~_umask
+
+
+def write_text_atomic(path, text):
+    """Writes via a temp file in the same directory and os.replace().
+
+    Readers (the dashboard, sync jobs, a concurrent extractor) see either the
+    old or the new file, never a half-written one.
+    """
+    import tempfile
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        # mkstemp creates 0600 files; keep the mode the file had, or what a
+        # plain open() would have given it, so other users can still read it
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = _new_file_mode()
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def write_json_atomic(path, data, indent=4):
+    write_text_atomic(path, json.dumps(data, indent=indent, ensure_ascii=False))
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from extraction_cache import DEFAULT_CACHE_DIR
+
+# Batch runner: one shared process pool for many archive roots. An archive
+# root is a directory laid out like this one: manifest.json plus the
+# EESZT_Archive/ it points at. Outputs (blood_results.json, web_app/data.js,
+# blood_analytics.json) are written back into each root.
+
+
+def _extract_job(filepath, cache_dir):
+    """Worker: extracts one document, going through the shared cache."""
+    from extraction_cache import ExtractionCache, extract_cached
+    from instrumentation import RunReport
+
+    start = time.perf_counter()
+    report = RunReport()
+    # Already one of N pool workers: OCR in-process rather than nesting a pool
+    results, cached = extract_cached(filepath, ExtractionCache(cache_dir), report, ocr_workers=1)
+    return results, report.to_dict(), time.perf_counter() - start, cached
+
+
+def _merge_job(archive_dir, output_file):
+    from merge_pdfs import merge_pdfs
+
+    start = time.perf_counter()
+    merge_pdfs(archive_dir, output_file)
+    return None, {}, time.perf_counter() - start, False
+
+
+def plan_archive(root):
+    """(kind, args, doc metadata) jobs for one archive root."""
+    from archive_pack import document_exists
+    from manifest import load_manifest, select_lab_documents
+
+    jobs = []
+    for doc in select_lab_documents(load_manifest(os.path.join(root, "manifest.json"))):
+        filepath = doc.get('filepath')
+        if not filepath:
+            continue
+        path = filepath if os.path.isabs(filepath) else os.path.join(root, filepath)
+        if not document_exists(path):
+            logging.warning(f"[{root}] Listed in manifest but missing: {filepath}")
+            continue
+        jobs.append(("extract", path, doc))
+    return jobs
+
+
+class ArchiveState:
+    def __init__(self, root, jobs):
+        self.root = root
+        self.pending = deque(jobs)
+        self.total = len(jobs)
+        self.done = 0
+        self.results = [None] * len(jobs)
+        self.finished = None
+        self.stats = {"documents": 0, "cached": 0, "results": 0, "job_seconds": 0.0}
+
+
+def run_batch(roots, workers=None, cache_dir=DEFAULT_CACHE_DIR, merge=False, db=None):
+    from extract_blood_results import write_outputs
+    from instrumentation import RunReport
+
+    report = RunReport()
+    archives = []
+    for root in roots:
+        jobs = plan_archive(root)
+        if merge:
+            jobs.append(("merge", os.path.join(root, "EESZT_Archive"), None))
+        archives.append(ArchiveState(root, [(i, *job) for i, job in enumerate(jobs)]))
+        logging.info(f"[{root}] {len(jobs)} jobs queued")
+
+    # Fair scheduling: jobs are handed out round-robin across archives and
+    # only a couple per worker are in flight, so one large archive can't
+    # starve the others and every archive finishes at a steady rate.
+    rotation = deque(a for a in archives if a.pending)
+    wall_start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        max_in_flight = 2 * workers
+        in_flight = {}
+
+        def submit_next():
+            while rotation:
+                archive = rotation.popleft()
+                if not archive.pending:
+                    continue
+                idx, kind, arg, doc = archive.pending.popleft()
+                if archive.pending:
+                    rotation.append(archive)
+                if kind == "merge":
+                    future = pool.submit(_merge_job, arg, os.path.join(archive.root, "merged_medical_history.pdf"))
+                else:
+                    future = pool.submit(_extract_job, arg, cache_dir)
+                in_flight[future] = (archive, idx, kind, arg, doc)
+                return True
+            return False
+
+        while len(in_flight) < max_in_flight and submit_next():
+            pass
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                archive, idx, kind, arg, doc = in_flight.pop(future)
+                try:
+                    results, job_report, seconds, cached = future.result()
+                except Exception as e:
+                    logging.error(f"[{archive.root}] {kind} job failed for {arg}: {e}")
+                    results, job_report, seconds, cached = None, {}, 0.0, False
+                report.merge(job_report)
+                archive.stats["job_seconds"] += seconds
+                if kind == "extract":
+                    archive.stats["documents"] += 1
+                    archive.stats["cached"] += int(cached)
+                    if results:
+                        archive.results[idx] = {"metadata": doc, "results": results}
+                        archive.stats["results"] += len(results)
+                archive.done += 1
+                if archive.done == archive.total:
+                    _finish_archive(archive, write_outputs, db)
+                while len(in_flight) < max_in_flight and submit_next():
+                    pass
+
+    for archive in archives:
+        if archive.finished is None:
+            _finish_archive(archive, write_outputs, db)
+
+    wall = time.perf_counter() - wall_start
+    summary = report.to_dict()
+    summary["archives"] = {
+        a.root: {
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in a.stats.items()},
+            "wall_seconds": round(a.finished - wall_start, 3),
+        }
+        for a in archives
+    }
+    total_docs = sum(a.stats["documents"] for a in archives)
+    total_results = sum(a.stats["results"] for a in archives)
+    summary["throughput"] = {
+        "archives": len(archives),
+        "documents": total_docs,
+        "results": total_results,
+        "wall_seconds": round(wall, 3),
+        "documents_per_sec": round(total_docs / wall, 2) if wall else None,
+        "results_per_sec": round(total_results / wall, 2) if wall else None,
+    }
+    return summary
+
+
+def _finish_archive(archive, write_outputs, db):
+    all_data = [r for r in archive.results if r]
+    out_db = os.path.join(archive.root, db) if db else None
+    write_outputs(all_data, out_dir=archive.root, db=out_db)
+    archive.finished = time.perf_counter()
+    logging.info(f"[{archive.root}] {len(all_data)} documents, {archive.stats['results']} results "
+                 f"({archive.stats['cached']} from cache)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract many patients' archives on one shared process pool.")
+    parser.add_argument("roots", nargs="+", help="Archive roots (each with manifest.json and EESZT_Archive/)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Extraction cache shared by all archives")
+    parser.add_argument("--merge", action="store_true", help="Also build merged_medical_history.pdf per archive")
+    parser.add_argument("--db", help="SQLite file name written inside each archive root")
+    parser.add_argument("--report", default="batch_report.json", help="Consolidated throughput report")
+    args = parser.parse_args(argv)
+
+    roots = [r for r in args.roots if os.path.isdir(r)]
+    for missing in sorted(set(args.roots) - set(roots)):
+        logging.error(f"Archive root not found: {missing}")
+
+    summary = run_batch(roots, args.workers, args.cache_dir, args.merge, args.db)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=4, ensure_ascii=False)
+    t = summary["throughput"]
+    logging.info(f"{t['documents']} documents / {t['results']} results from {t['archives']} archives "
+                 f"in {t['wall_seconds']}s ({t['documents_per_sec']} docs/s). Report: {args.report}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    main()
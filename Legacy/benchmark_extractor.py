@@ -0,0 +1,421 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+from datetime import datetime, timedelta
+
+from instrumentation import peak_rss_mb
+
+# Benchmark for extract_from_pdf over a generated corpus.
+# The PDFs are written by a tiny built-in writer (standard Helvetica font,
+# no external dependency) so the corpus and its ground truth can be
+# regenerated anywhere from a seed.
+
+DEFAULT_HISTORY = "benchmarks/history.jsonl"
+# Bump when the generator changes; runs are only compared within a version
+CORPUS_VERSION = 2
+
+# (name, unit, ref_min, ref_max, decimals) - names are taken from
+# VALID_TEST_NAMES / the explicit mappings so the extractor's
+# normalization should map them back to themselves.
+ANALYTES = [
+    ("Nátrium", "mmol/L", 136, 145, 0),
+    ("Kálium", "mmol/L", 3.5, 5.1, 1),
+    ("Klorid", "mmol/L", 98, 107, 0),
+    ("Kalcium", "mmol/L", 2.15, 2.55, 2),
+    ("Magnézium", "mmol/L", 0.66, 1.07, 2),
+    ("Foszfát", "mmol/L", 0.81, 1.45, 2),
+    ("Karbamid", "mmol/L", 2.8, 7.2, 1),
+    ("Kreatinin", "umol/L", 62, 106, 0),
+    ("Húgysav", "umol/L", 208, 428, 0),
+    ("Albumin", "g/L", 35, 52, 1),
+    ("Összfehérje", "g/L", 64, 83, 1),
+    ("GGT", "U/L", 10, 71, 0),
+    ("LDH", "U/L", 135, 225, 0),
+    ("Triglicerid", "mmol/L", 0.0, 1.7, 2),
+    ("HDL-koleszterin", "mmol/L", 1.0, 2.5, 2),
+    ("LDL-koleszterin", "mmol/L", 0.0, 3.0, 2),
+    ("Ferritin", "ug/L", 30, 400, 0),
+    ("Transzferrin", "g/L", 2.0, 3.6, 2),
+    ("TSH", "mU/L", 0.27, 4.2, 2),
+    ("HbA1c", "%", 4.0, 6.0, 1),
+    ("Fibrinogén", "g/L", 2.0, 4.0, 2),
+    ("Folsav", "nmol/L", 8.8, 60.8, 1),
+    ("Hemoglobin", "g/L", 135, 175, 0),
+    ("Hematokrit", "L/L", 0.40, 0.52, 2),
+    ("Fehérvérsejtszám", "G/L", 4.0, 10.0, 2),
+    ("Vörösvérsejtszám", "T/L", 4.5, 5.9, 2),
+    ("Trombocitaszám", "G/L", 150, 400, 0),
+]
+
+NOISE_HEADERS = [
+    "SYNLAB Hungary Kft. - Laboratóriumi lelet",
+    "Leletnyomtatás dátuma: {date}",
+    "Hiteles másolat, elektronikusan validálva",
+]
+NOISE_FOOTERS = [
+    "Validálók: Dr. Minta Péter főorvos",
+    "Oldal: {page}/{pages}",
+    "Ügyfélszolgálat telefon: +36 1 000 0000, e-mail: info@example.hu",
+]
+
+LAYOUTS = ["synlab", "hospital", "hospital_split", "merged"]
+
+PAGE_W, PAGE_H = 595, 842
+ROW_H = 16
+ROWS_PER_PAGE = 36
+
+# Helvetica/WinAnsi lacks the Hungarian double-acute letters; remap them
+# onto unused Latin-1 slots through a /Differences array.
+HU_CODES = {"Ő": 213, "Ű": 219, "ő": 245, "ű": 251}
+HU_DIFFERENCES = "[213 /Ohungarumlaut 219 /Uhungarumlaut 245 /ohungarumlaut 251 /uhungarumlaut]"
+
+
+def _pdf_string(text):
+    out = bytearray()
+    for ch in text:
+        if ch in HU_CODES:
+            out.append(HU_CODES[ch])
+        else:
+            out.extend(ch.encode('cp1252', errors='replace'))
+    escaped = out.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    return b"(" + bytes(escaped) + b")"
+
+
+class SyntheticPdf:
+    """Minimal single-font PDF writer for text and ruling lines."""
+
+    def __init__(self):
+        self.pages = []
+
+    def new_page(self):
+        self.pages.append([])
+        return self.pages[-1]
+
+    @staticmethod
+    def text(page, x, y, text, size=9):
+        page.append(b"BT /F1 %d Tf %.2f %.2f Td " % (size, x, PAGE_H - y) + _pdf_string(text) + b" Tj ET")
+
+    @staticmethod
+    def line(page, x1, y1, x2, y2):
+        page.append(b"%.2f %.2f m %.2f %.2f l S" % (x1, PAGE_H - y1, x2, PAGE_H - y2))
+
+    def write(self, path):
+        objects = []
+
+        def add(body):
+            objects.append(body)
+            return len(objects)
+
+        catalog_id = add(None)
+        pages_id = add(None)
+        font_id = add(
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding << /Type /Encoding "
+            b"/BaseEncoding /WinAnsiEncoding /Differences " + HU_DIFFERENCES.encode() + b" >> >>"
+        )
+        page_ids = []
+        for ops in self.pages:
+            stream = b"0.5 w\n" + b"\n".join(ops)
+            content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+            page_ids.append(add(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] "
+                b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+                % (pages_id, PAGE_W, PAGE_H, font_id, content_id)
+            ))
+        objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+        kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+        objects[pages_id - 1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for i, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+        xref_pos = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for off in offsets:
+            out += b"%010d 00000 n \n" % off
+        out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(objects) + 1, catalog_id, xref_pos)
+        with open(path, 'wb') as f:
+            f.write(out)
+
+
+def _format_number(value, decimals, comma):
+    text = f"{value:.{decimals}f}"
+    return text.replace(".", ",") if comma else text
+
+
+def _make_rows(rng, count, comma):
+    # More rows than analytes repeat the panel, as in cumulative reports
+    # listing several visits; each pass is shuffled on its own.
+    analytes = []
+    while len(analytes) < count:
+        analytes += rng.sample(ANALYTES, min(len(ANALYTES), count - len(analytes)))
+    rows = []
+    seen = set()
+    for name, unit, lo, hi, decimals in analytes:
+        span = hi - lo
+        roll = rng.random()
+        if roll < 0.1:
+            value = lo - span * rng.uniform(0.05, 0.3)
+        elif roll < 0.2:
+            value = hi + span * rng.uniform(0.05, 0.3)
+        else:
+            value = rng.uniform(lo, hi)
+        value = max(value, 0.0)
+        result = _format_number(value, decimals, comma)
+        # Identical repeats would be merged by the extractor and scored as misses
+        while (name, result) in seen:
+            value += 10 ** -decimals
+            result = _format_number(value, decimals, comma)
+        seen.add((name, result))
+        flag = "-" if value < lo else "+" if value > hi else ""
+        rows.append({
+            "test_name": name,
+            "result": result,
+            "unit": unit,
+            "ref_range": f"{_format_number(lo, decimals, comma)} - {_format_number(hi, decimals, comma)}",
+            "flag": flag,
+        })
+    return rows
+
+
+def _draw_noise(pdf, page, page_no, pages, date_text):
+    for i, text in enumerate(NOISE_HEADERS):
+        pdf.text(page, 40, 30 + i * 12, text.format(date=date_text), size=8)
+    for i, text in enumerate(NOISE_FOOTERS):
+        pdf.text(page, 40, PAGE_H - 50 + i * 12, text.format(page=page_no, pages=pages), size=7)
+
+
+def _draw_ruled(pdf, page, top, columns, rows, header_lines):
+    """Grid table: header_lines is a list of header rows (split headers use two)."""
+    x_edges = [c[1] for c in columns] + [columns[-1][1] + columns[-1][2]]
+    header_h = ROW_H * len(header_lines) if header_lines else 0
+    y_edges = []
+    y = top
+    if header_lines:
+        y_edges.append(y)
+        for li, line in enumerate(header_lines):
+            for (_, x, _), label in zip(columns, line):
+                if label:
+                    pdf.text(page, x + 3, y + 11 + li * ROW_H, label)
+        y += header_h
+    y_edges.append(y)
+    for cells in rows:
+        for (_, x, _), cell in zip(columns, cells):
+            if cell:
+                pdf.text(page, x + 3, y + 11, cell)
+        y += ROW_H
+        y_edges.append(y)
+    for yy in y_edges:
+        pdf.line(page, x_edges[0], yy, x_edges[-1], yy)
+    for xx in x_edges:
+        pdf.line(page, xx, y_edges[0], xx, y_edges[-1])
+
+
+def _draw_whitespace(pdf, page, top, columns, rows, header):
+    y = top
+    if header:
+        for (_, x, _), label in zip(columns, header):
+            pdf.text(page, x, y, label)
+        y += ROW_H
+    for cells in rows:
+        for (_, x, _), cell in zip(columns, cells):
+            if cell:
+                pdf.text(page, x, y, cell)
+        y += ROW_H
+
+
+def generate_document(path, layout, rng, n_results, date_text):
+    """Writes one synthetic report and returns its ground truth."""
+    comma = layout != "synlab"
+    rows = _make_rows(rng, n_results, comma)
+    pdf = SyntheticPdf()
+
+    if layout == "synlab":
+        columns = [("v", 40, 190), ("e", 235, 70), ("m", 310, 70), ("r", 385, 100), ("f", 490, 60)]
+        header = [["Vizsgálat", "Eredmény", "Mértékegység", "Referencia tartomány", "Minősítés"]]
+        cells = [[r["test_name"], r["result"], r["unit"], r["ref_range"], r["flag"]] for r in rows]
+    elif layout == "hospital":
+        columns = [("v", 40, 190), ("e", 230, 70), ("m", 300, 80), ("r", 380, 120)]
+        header = [["Megnevezés", "Eredmény", "Egység", "Referencia tartomány"]]
+        cells = [[r["test_name"], r["result"], r["unit"], r["ref_range"]] for r in rows]
+    elif layout == "hospital_split":
+        columns = [("v", 40, 190), ("e", 230, 70), ("m", 300, 80), ("r", 380, 120)]
+        header = [["Megnevezés", "Ered-", "Egység", "Referencia"], ["", "mény", "", "tartomány"]]
+        cells = [[r["test_name"], r["result"], r["unit"], r["ref_range"]] for r in rows]
+    elif layout == "merged":
+        columns = [("v", 40, 260), ("r", 300, 140)]
+        header = [["Vizsgálat eredmény", "Referencia"]]
+        cells = [[f'{r["test_name"]} {r["result"]} {r["unit"]}', r["ref_range"]] for r in rows]
+    else:
+        raise ValueError(f"Unknown layout: {layout}")
+
+    chunks = [cells[i:i + ROWS_PER_PAGE] for i in range(0, len(cells), ROWS_PER_PAGE)] or [[]]
+    for page_no, chunk in enumerate(chunks, start=1):
+        page = pdf.new_page()
+        _draw_noise(pdf, page, page_no, len(chunks), date_text)
+        # Continuation pages repeat no header: the extractor has to inherit it.
+        page_header = header if page_no == 1 else None
+        if layout == "synlab":
+            _draw_whitespace(pdf, page, 90, columns, chunk, page_header[0] if page_header else None)
+        else:
+            _draw_ruled(pdf, page, 80, columns, chunk, page_header)
+    pdf.write(path)
+
+    return {
+        "filepath": path,
+        "layout": layout,
+        "pages": len(chunks),
+        "results": [{"test_name": r["test_name"], "result": r["result"]} for r in rows],
+    }
+
+
+def generate_corpus(out_dir, n_docs, seed=0, min_results=8, max_results=2 * ROWS_PER_PAGE):
+    """Writes n_docs reports; with the default sizes about half of them run
+    onto a header-less continuation page."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    truth = []
+    day = datetime(2018, 1, 1)
+    for i in range(n_docs):
+        layout = LAYOUTS[i % len(LAYOUTS)]
+        day += timedelta(days=rng.randint(20, 120))
+        date_text = day.strftime("%Y.%m.%d.")
+        path = os.path.join(out_dir, f"{i:05d}_{layout}.pdf")
+        truth.append(generate_document(path, layout, rng, rng.randint(min_results, max_results), date_text))
+    with open(os.path.join(out_dir, "ground_truth.json"), 'w', encoding='utf-8') as f:
+        json.dump(truth, f, indent=4, ensure_ascii=False)
+    return truth
+
+
+def _key(entry):
+    return (entry["test_name"].strip().lower(), entry["result"].strip().replace(",", "."))
+
+
+def score(expected, extracted):
+    want = Counter(_key(e) for e in expected)
+    got = Counter(_key(e) for e in extracted)
+    tp = sum((want & got).values())
+    return tp, sum(got.values()), sum(want.values())
+
+
+def run_benchmark(truth):
+    from extract_blood_results import extract_from_pdf
+
+    # The extractor logs every header it finds; keep that out of the timings.
+    logging.getLogger().setLevel(logging.WARNING)
+
+    per_layout = {}
+    totals = {"pages": 0, "results": 0, "tp": 0, "got": 0, "want": 0, "seconds": 0.0}
+    for doc in truth:
+        start = time.perf_counter()
+        extracted = extract_from_pdf(doc["filepath"])
+        elapsed = time.perf_counter() - start
+        tp, got, want = score(doc["results"], extracted)
+        for bucket in (totals, per_layout.setdefault(doc["layout"], dict.fromkeys(totals, 0))):
+            bucket["pages"] += doc["pages"]
+            bucket["results"] += len(extracted)
+            bucket["tp"] += tp
+            bucket["got"] += got
+            bucket["want"] += want
+            bucket["seconds"] += elapsed
+
+    def summarize(b):
+        return {
+            "pages": b["pages"],
+            "results": b["results"],
+            "seconds": round(b["seconds"], 3),
+            "pages_per_sec": round(b["pages"] / b["seconds"], 2) if b["seconds"] else None,
+            "results_per_sec": round(b["results"] / b["seconds"], 2) if b["seconds"] else None,
+            "precision": round(b["tp"] / b["got"], 4) if b["got"] else 0.0,
+            "recall": round(b["tp"] / b["want"], 4) if b["want"] else 0.0,
+        }
+
+    report = summarize(totals)
+    report["documents"] = len(truth)
+    report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    report["layouts"] = {name: summarize(b) for name, b in sorted(per_layout.items())}
+    return report
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def check_regression(report, previous, tolerance=0.1):
+    """Compares against the previous run with the same corpus parameters."""
+    problems = []
+    if not previous:
+        return problems
+    for metric in ("precision", "recall"):
+        if report[metric] < previous[metric]:
+            problems.append(f"{metric} dropped {previous[metric]} -> {report[metric]}")
+    for metric in ("pages_per_sec", "results_per_sec"):
+        if previous.get(metric) and report.get(metric) and report[metric] < previous[metric] * (1 - tolerance):
+            problems.append(f"{metric} dropped {previous[metric]} -> {report[metric]}")
+    return problems
+
+
+def load_previous(history_path, docs, seed, corpus_version=CORPUS_VERSION):
+    if not os.path.exists(history_path):
+        return None
+    previous = None
+    with open(history_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            entry = json.loads(line)
+            if (entry.get("documents") == docs and entry.get("seed") == seed
+                    and entry.get("corpus_version", 1) == corpus_version):
+                previous = entry
+    return previous
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark extract_from_pdf on a synthetic lab-report corpus.")
+    parser.add_argument("--docs", type=int, default=40, help="Number of documents to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", help="Keep the generated corpus here (default: temp dir)")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSONL file the results are appended to")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative throughput drop")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = args.corpus_dir or tmp
+        truth = generate_corpus(corpus_dir, args.docs, seed=args.seed)
+        report = run_benchmark(truth)
+
+    report.update({
+        "timestamp": datetime.now().isoformat(),
+        "revision": _git_revision(),
+        "seed": args.seed,
+        "corpus_version": CORPUS_VERSION,
+    })
+    previous = load_previous(args.history, args.docs, args.seed)
+    problems = check_regression(report, previous, args.tolerance)
+
+    os.makedirs(os.path.dirname(args.history) or ".", exist_ok=True)
+    with open(args.history, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+    print(json.dumps(report, indent=4, ensure_ascii=False))
+    for problem in problems:
+        print(f"REGRESSION vs {previous['revision']}: {problem}")
+    if problems and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
+    main()
@@ -0,0 +1,174 @@
+import os
+import json
+import hashlib
+import logging
+import argparse
+
+from atomic_io import write_json_atomic
+
+# Versioned outputs for sync jobs. Next to the full blood_results.json and
+# data.js (which the web app still loads from file:// as a script), each
+# archive keeps web_app/versions/ with
+#   index.json        {"version": M, "base": B, "deltas": [B+1, ..., M],
+#                      "history": [H, ..., B]}
+#   base-B.json       every document record as of version B
+#   delta-V.json      documents added/changed/removed between V-1 and V
+# A consumer holding version N >= H-1 fetches delta-(N+1) ... delta-M only;
+# anyone older starts again from base-B. Compaction keeps the last
+# DEFAULT_RETAIN_DELTAS deltas as history (and the previous base), so
+# clients just behind a compaction, or holding the old index.json, still
+# find their files.
+
+DEFAULT_VERSIONS_DIR = os.path.join("web_app", "versions")
+DEFAULT_COMPACT_EVERY = 20
+DEFAULT_RETAIN_DELTAS = 100
+
+
+def doc_key(record):
+    """Stable identity of a document record across runs."""
+    metadata = record.get("metadata", {})
+    if metadata.get("filepath"):
+        return metadata["filepath"]
+    payload = json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_index(versions_dir):
+    path = os.path.join(versions_dir, "index.json")
+    if not os.path.exists(path):
+        return {"version": 0, "base": 0, "deltas": []}
+    return _read(path)
+
+
+def apply_delta(docs, delta):
+    """Applies one delta to a {key: record} dict in place."""
+    for key in delta["removed"]:
+        docs.pop(key, None)
+    for record in delta["added"] + delta["changed"]:
+        docs[doc_key(record)] = record
+    return docs
+
+
+def materialize(versions_dir, index=None):
+    """{key: record} for the latest version."""
+    index = index or load_index(versions_dir)
+    docs = {}
+    if index["version"] == 0:
+        return docs
+    for record in _read(os.path.join(versions_dir, f"base-{index['base']}.json"))["documents"]:
+        docs[doc_key(record)] = record
+    for version in index["deltas"]:
+        apply_delta(docs, _read(os.path.join(versions_dir, f"delta-{version}.json")))
+    return docs
+
+
+def compute_delta(old_docs, new_docs):
+    return {
+        "added": [r for k, r in new_docs.items() if k not in old_docs],
+        "changed": [r for k, r in new_docs.items() if k in old_docs and old_docs[k] != r],
+        "removed": [k for k in old_docs if k not in new_docs],
+    }
+
+
+def deltas_since(versions_dir, version):
+    """Delta file names a consumer at `version` needs, or None if it must reload the base."""
+    index = load_index(versions_dir)
+    chain = index.get("history", []) + index["deltas"]
+    if version < index["base"] and (not chain or version < chain[0] - 1):
+        return None
+    return [f"delta-{v}.json" for v in chain if v > version]
+
+
+def publish(all_data, versions_dir=DEFAULT_VERSIONS_DIR, compact_every=DEFAULT_COMPACT_EVERY):
+    """Records all_data as a new version if it differs from the latest one."""
+    os.makedirs(versions_dir, exist_ok=True)
+    index = load_index(versions_dir)
+    new_docs = {doc_key(r): r for r in all_data}
+
+    if index["version"] == 0:
+        return _write_base(versions_dir, 1, new_docs)
+
+    delta = compute_delta(materialize(versions_dir, index), new_docs)
+    if not (delta["added"] or delta["changed"] or delta["removed"]):
+        return index["version"]
+
+    version = index["version"] + 1
+    # The delta goes first and index.json last, so a reader never sees a
+    # version whose file isn't there yet.
+    write_json_atomic(os.path.join(versions_dir, f"delta-{version}.json"),
+                      {"version": version, "from": version - 1, **delta}, indent=None)
+    index = {**index, "version": version, "deltas": index["deltas"] + [version]}
+    write_json_atomic(os.path.join(versions_dir, "index.json"), index)
+    logging.info(f"Published version {version}: {len(delta['added'])} added, "
+                 f"{len(delta['changed'])} changed, {len(delta['removed'])} removed")
+
+    if compact_every and len(index["deltas"]) >= compact_every:
+        compact(versions_dir)
+    return version
+
+
+def _write_base(versions_dir, version, docs, history=()):
+    write_json_atomic(os.path.join(versions_dir, f"base-{version}.json"),
+                      {"version": version, "documents": list(docs.values())}, indent=None)
+    write_json_atomic(os.path.join(versions_dir, "index.json"),
+                      {"version": version, "base": version, "deltas": [], "history": list(history)})
+    return version
+
+
+def compact(versions_dir=DEFAULT_VERSIONS_DIR, retain=DEFAULT_RETAIN_DELTAS):
+    """Folds all deltas into a new base at the latest version.
+
+    The newest `retain` deltas stay on disk as history, and the previous
+    base is kept until the next compaction; older files are removed.
+    """
+    index = load_index(versions_dir)
+    if not index["deltas"]:
+        return index["version"]
+    chain = index.get("history", []) + index["deltas"]
+    history = chain[-retain:] if retain else []
+    _write_base(versions_dir, index["version"], materialize(versions_dir, index), history)
+
+    keep = {f"base-{index['version']}.json", f"base-{index['base']}.json", "index.json"}
+    keep.update(f"delta-{v}.json" for v in history)
+    removed = 0
+    for name in os.listdir(versions_dir):
+        if name.endswith(".json") and name.startswith(("base-", "delta-")) and name not in keep:
+            os.unlink(os.path.join(versions_dir, name))
+            removed += 1
+    logging.info(f"Compacted {len(index['deltas'])} deltas into base-{index['version']}.json "
+                 f"({len(history)} kept as history, {removed} files removed)")
+    return index["version"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or compact versioned web app outputs.")
+    parser.add_argument("--dir", default=DEFAULT_VERSIONS_DIR, help="Versions directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Show the current version, base and pending deltas")
+    p_compact = sub.add_parser("compact", help="Fold all deltas into a new base")
+    p_compact.add_argument("--retain", type=int, default=DEFAULT_RETAIN_DELTAS,
+                           help="Deltas kept for consumers behind the new base")
+    p_since = sub.add_parser("since", help="List the delta files a consumer at VERSION needs")
+    p_since.add_argument("version", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "compact":
+        compact(args.dir, args.retain)
+    elif args.command == "since":
+        files = deltas_since(args.dir, args.version)
+        if files is None:
+            print(f"Version {args.version} predates the base; reload base-{load_index(args.dir)['base']}.json")
+        else:
+            print("\n".join(files) if files else "Up to date.")
+    else:
+        print(json.dumps(load_index(args.dir), indent=4))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    main()
@@ -4,17 +4,24 @@ import json
 import time
 import logging
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
-from playwright.sync_api import sync_playwright, TimeoutError
-# Setup logging
-logging.basicConfig(filename='eeszt_downloader.log', level=logging.INFO, 
-                    format='%(asctime)s - %(levelname)s - %(message)s')
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-logging.getLogger('').addHandler(console)
+
+from manifest import normalize_entry
+LOG_FILE = 'eeszt_downloader.log'
 ARCHIVE_DIR = "./EESZT_Archive"
 MANIFEST_FILE = "manifest.json"
 ERRORS_LOG = "errors.log"
+def setup_logging():
+    # Always log to eeszt_downloader.log; add a console handler unless the
+    # caller (e.g. eeszt.py) already configured one.
+    root = logging.getLogger('')
+    root.setLevel(logging.INFO)
+    file_handler = logging.FileHandler(LOG_FILE)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root.addHandler(file_handler)
+    if not any(type(h) is logging.StreamHandler for h in root.handlers):
+        console = logging.StreamHandler()
+        console.setLevel(logging.INFO)
+        root.addHandler(console)
 def setup_directories():
     if not os.path.exists(ARCHIVE_DIR):
         os.makedirs(ARCHIVE_DIR)
@@ -30,7 +37,8 @@ def load_manifest():
     return []
 def save_manifest_entry(entry):
     manifest = load_manifest()
-    manifest.append(entry)
+    # Typed date/type/institution fields are parsed once, here
+    manifest.append(normalize_entry(entry))
     with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
         json.dump(manifest, f, indent=4, ensure_ascii=False)
 def is_duplicate(entry, manifest):
@@ -287,6 +295,14 @@ def extract_table_data(page):
         except:
             break
 def main():
+    # Browser automation only needs these here, so importing this module
+    # (e.g. for the manifest helpers) stays cheap.
+    try:
+        from dateutil.relativedelta import relativedelta
+        from playwright.sync_api import sync_playwright
+    except ImportError as e:
+        logging.error(f"{e.name} not installed. Please install it using: pip install playwright python-dateutil")
+        return
     setup_directories()
     
     with sync_playwright() as p:
@@ -326,4 +342,5 @@ def main():
         logging.info("All windows processed.")
         browser.close()
 if __name__ == "__main__":
+    setup_logging()
     main()
\ No newline at end of file
@@ -0,0 +1,228 @@
+import os
+import sys
+import time
+import logging
+import argparse
+
+# Single entry point for the archive tools:
+#
+#   python eeszt.py [--root DIR] [--workers N] <command> [options]
+#
+# Only os/sys/argparse/logging are imported up front; each command imports
+# its own module (and with it playwright, pdfplumber, pypdf or numpy) when
+# it runs, so status/manifest answer without loading any PDF stack.
+# Commands marked "forwarded" take the same options as the script they wrap
+# (python eeszt.py extract --db blood_results.db == extract_blood_results.py
+# --db blood_results.db).
+
+ARCHIVE_DIR = "EESZT_Archive"
+MANIFEST_FILE = "manifest.json"
+IMPORT_PROFILE_TOP = 15
+
+FORWARDED = {
+    "extract": ("extract_blood_results", "Extract blood results (forwarded)"),
+    "batch": ("batch_extract", "Extract several archive roots on one pool (forwarded)"),
+    "watch": ("watch_archive", "Re-extract incrementally as PDFs land (forwarded)"),
+    "query": ("results_store", "Import into / query the SQLite store (forwarded)"),
+    "versions": ("delta_outputs", "Versioned output status/compaction (forwarded)"),
+    "pack": ("archive_pack", "Pack/unpack/list the archive (forwarded)"),
+    "serve": ("extract_service", "Warm HTTP extraction service (forwarded)"),
+}
+# Forwarded commands that understand --workers
+ACCEPTS_WORKERS = {"batch", "serve"}
+
+
+def cmd_download(args, extra):
+    from downloader import main, setup_logging
+    setup_logging()
+    main()
+
+
+def cmd_merge(args, extra):
+    from merge_pdfs import merge_pdfs
+    merge_pdfs(ARCHIVE_DIR, args.output)
+
+
+def cmd_inspect(args, extra):
+    from inspect_pdf import main
+    main([args.file] if args.file else [])
+
+
+def cmd_index(args, extra):
+    from inspect_pdf import batch_inspect, print_summary
+    if not os.path.isdir(ARCHIVE_DIR):
+        logging.error(f"Archive directory not found: {ARCHIVE_DIR}")
+        sys.exit(1)
+    print_summary(batch_inspect(ARCHIVE_DIR, args.index, args.workers, args.refresh))
+
+
+def cmd_status(args, extra):
+    import json
+    from archive_pack import document_exists, list_documents, packed_archive
+    from manifest import load_manifest, select_lab_documents
+
+    manifest = load_manifest(MANIFEST_FILE) if os.path.exists(MANIFEST_FILE) else []
+    labs = select_lab_documents(manifest)
+    missing = sum(1 for d in manifest if d.get("filepath") and not document_exists(d["filepath"]))
+    print(f"Manifest:  {len(manifest)} documents, {len(labs)} laboratory, {missing} missing from the archive")
+
+    if os.path.isdir(ARCHIVE_DIR):
+        pack = packed_archive(ARCHIVE_DIR)
+        print(f"Archive:   {len(list_documents(ARCHIVE_DIR))} PDFs ({len(pack.names()) if pack else 0} packed)")
+    else:
+        print(f"Archive:   {ARCHIVE_DIR} not found")
+
+    for path in ("blood_results.json", "blood_analytics.json", "web_app/data.js"):
+        if os.path.exists(path):
+            st = os.stat(path)
+            print(f"Output:    {path} ({st.st_size // 1024} KiB, {time.strftime('%Y-%m-%d %H:%M', time.localtime(st.st_mtime))})")
+        else:
+            print(f"Output:    {path} (not generated)")
+
+    index_path = os.path.join("web_app", "versions", "index.json")
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        print(f"Versions:  v{index['version']} (base {index['base']}, {len(index['deltas'])} deltas)")
+
+
+def cmd_manifest(args, extra):
+    import json
+    from collections import Counter
+    from manifest import ManifestIndex, load_manifest, migrate_manifest, select_lab_documents
+
+    if args.migrate:
+        migrate_manifest(MANIFEST_FILE)
+        return
+    index = ManifestIndex(load_manifest(MANIFEST_FILE))
+    if args.lab:
+        docs = select_lab_documents(index, args.since, args.until)
+    elif args.type is not None:
+        docs = index.by_type([args.type], args.since, args.until)
+    elif args.since or args.until:
+        docs = index.between(args.since, args.until)
+    else:
+        docs = index.chronological()
+    if args.json:
+        print(json.dumps(docs, indent=4, ensure_ascii=False))
+        return
+    if args.list:
+        for d in docs:
+            print(f"{d['date_start'] or '?':<10} {d['type_code'] or '':>3} {(d['institution_name'] or '')[:40]:<40} "
+                  f"{(d['type_name'] or '')[:50]}")
+        return
+    print(f"{len(docs)} documents")
+    dates = [d["date_start"] for d in docs if d["date_start"]]
+    if dates:
+        print(f"{min(dates)} .. {max(dates)}")
+    for label, key in (("type", lambda d: f"{d['type_name']} ({d['type_code']})"),
+                       ("institution", lambda d: d["institution"])):
+        print(f"\nBy {label}:")
+        for value, count in Counter(key(d) for d in docs).most_common():
+            print(f"  {count:>5}  {value}")
+
+
+def run_forwarded(args, extra):
+    import importlib
+    module = importlib.import_module(FORWARDED[args.command][0])
+    if args.workers and args.command in ACCEPTS_WORKERS and "--workers" not in extra:
+        extra = extra + ["--workers", str(args.workers)]
+    module.main(extra)
+
+
+def import_profile(argv):
+    """Re-runs the command under -X importtime and summarises the imports."""
+    import subprocess
+
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(__file__)] + argv,
+                          stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - start
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            sys.stderr.write(line + "\n")
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        try:
+            rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+        except ValueError:
+            continue  # column header
+
+    # The shallowest entries are the top-level imports; nested ones are
+    # already part of their cumulative time.
+    depth = min((len(n) - len(n.lstrip()) for _, _, n in rows), default=0)
+    total_us = sum(c for c, _, n in rows if len(n) - len(n.lstrip()) == depth)
+    print(f"\nImport profile: {len(rows)} modules, {total_us / 1000:.1f} ms importing, "
+          f"{wall * 1000:.0f} ms wall", file=sys.stderr)
+    print(f"{'cumulative':>12} {'self':>10}  module", file=sys.stderr)
+    for cumulative, self_time, name in sorted(rows, reverse=True)[:IMPORT_PROFILE_TOP]:
+        print(f"{cumulative / 1000:>10.1f}ms {self_time / 1000:>8.1f}ms  {name.strip()}", file=sys.stderr)
+    return proc.returncode
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="EESZT archive tools.")
+    parser.add_argument("--root", default=".",
+                        help="Archive root (manifest.json, EESZT_Archive/, outputs); all paths are relative to it")
+    parser.add_argument("--workers", type=int, help="Worker processes for parallel commands (default: CPU count)")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--import-profile", action="store_true",
+                        help="Run the command under -X importtime and print the slowest imports")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("download", help="Download new documents from EESZT (needs playwright)")
+    p_merge = sub.add_parser("merge", help="Merge the archive into one PDF")
+    p_merge.add_argument("--output", default="merged_medical_history.pdf")
+    p_inspect = sub.add_parser("inspect", help="Print the first pages of one PDF")
+    p_inspect.add_argument("file", nargs="?")
+    p_index = sub.add_parser("index", help="Triage every archive PDF in parallel")
+    p_index.add_argument("--index", default="archive_index.json")
+    p_index.add_argument("--refresh", action="store_true", help="Re-probe files already in the index")
+    sub.add_parser("status", help="Manifest, archive and output overview")
+    p_manifest = sub.add_parser("manifest", help="Summarise or list manifest.json")
+    p_manifest.add_argument("--lab", action="store_true", help="Only laboratory documents")
+    p_manifest.add_argument("--list", action="store_true", help="One line per document")
+    p_manifest.add_argument("--json", action="store_true", help="Print the (filtered) records as JSON")
+    p_manifest.add_argument("--type", type=int, help="Only this type code (e.g. 12)")
+    p_manifest.add_argument("--since", help="Dated on/after (YYYY, YYYY-MM or YYYY-MM-DD)")
+    p_manifest.add_argument("--until", help="Dated on/before (YYYY, YYYY-MM or YYYY-MM-DD)")
+    p_manifest.add_argument("--migrate", action="store_true", help="Rewrite manifest.json with typed fields")
+    for name, (_, help_text) in FORWARDED.items():
+        sub.add_parser(name, help=help_text, add_help=False)
+    return parser
+
+
+COMMANDS = {
+    "download": cmd_download,
+    "merge": cmd_merge,
+    "inspect": cmd_inspect,
+    "index": cmd_index,
+    "status": cmd_status,
+    "manifest": cmd_manifest,
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.import_profile:
+        sys.exit(import_profile([a for a in argv if a != "--import-profile"]))
+    if extra and args.command not in FORWARDED:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+
+    logging.basicConfig(level=args.log_level, format='%(levelname)s: %(message)s')
+    if not os.path.isdir(args.root):
+        logging.error(f"Archive root not found: {args.root}")
+        sys.exit(1)
+    os.chdir(args.root)
+    # Helper modules live next to this file, wherever we were started from
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    COMMANDS.get(args.command, run_forwarded)(args, extra)
+
+
+if __name__ == "__main__":
+    main()
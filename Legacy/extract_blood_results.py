@@ -2,15 +2,24 @@ import json
 import os
 import re
 import sys
+import mmap
+import time
 import logging
+import argparse
 from datetime import datetime
+from contextlib import ExitStack
 
-# Setup logging
 import difflib
+from functools import lru_cache
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
-
+from analyze_results import analyze, save_report
+from archive_pack import document_exists, open_document
+from manifest import load_manifest, select_lab_documents
+from ocr_fallback import DEFAULT_OCR_CACHE_DIR, ocr_textless_pages, tesseract_available
+from results_store import write_results
+from delta_outputs import publish, DEFAULT_VERSIONS_DIR
+from atomic_io import write_text_atomic, write_json_atomic
+from instrumentation import RunReport, get_report, new_report, run_profiled, current_rss_mb, peak_rss_mb
 
 VALID_TEST_NAMES = [
     "Albumin", "Alkalikus foszfatáz (AP)", "Alfa-Amiláz", "Amiláz izoenzimek", "Pankreász specifikus amiláz",
@@ -52,13 +61,6 @@ VALID_TEST_NAMES = [
     "B-lymphocyta", "NK-lymphocyta"
 ]
 
-def load_manifest(manifest_path="manifest.json"):
-    if not os.path.exists(manifest_path):
-        logging.error(f"Manifest not found at {manifest_path}")
-        return []
-    with open(manifest_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
 def clean_text(text):
     if not text:
         return ""
@@ -118,7 +120,474 @@ def parse_ref_range(ref_str):
         
     return None, None
 
-def extract_from_pdf(filepath):
+NOISE_PHRASES = ["laboratóriumi lelet", "validálók", "oldal:", "hiteles", "amennyiben egy vizsgálatnál", "készült", "dátuma:", "időpontja:", "synlab", "leletnyo", "érvényes", "dr.", "főorvos", "belgyógyász", "asszisztens", "telefon", "fax", "email", "e-mail", "utc", "tér", "kerület", "emelet", "ajtó", "szakrendelő", "kórház", "laboratórium", "időpont", "honlap", "ügyfélszolgálat", "járóbeteg", "beutaló"]
+
+UNIT_VALUES = ["Giga/L", "Tera/L", "g/L", "L/L", "fL", "pg", "%", "mmol/L", "umol/L", "kU/L", "U/L", "IU/mL"]
+
+DEFAULT_PAGE_WINDOW = 25
+
+TABLE_STRATEGIES = [
+    ("lines", {}), # Default (lines)
+    ("text", {"vertical_strategy": "text", "horizontal_strategy": "text"}), # Whitespace
+]
+
+def find_header(table):
+    """Returns (row index, header texts, column map) or (-1, [], None)."""
+    for i, row in enumerate(table):
+        # Clean row content
+        row_texts = [clean_text(cell) for cell in row]
+        
+        vizsgalat_idx = -1
+        eredmeny_idx = -1
+        mertekegyseg_idx = -1
+        ref_idx = -1
+        minosites_idx = -1
+        
+        # Identify columns in this row
+        for idx, cell in enumerate(row_texts):
+            c_lower = cell.lower()
+            
+            if any(k in c_lower for k in ["vizsgálat", "megnevezés", "teszt"]):
+                if vizsgalat_idx == -1: vizsgalat_idx = idx
+            
+            if "mértékegység" in c_lower or "m.e." in c_lower or "egység" in c_lower:
+                mertekegyseg_idx = idx
+                continue
+
+            if any(k in c_lower for k in ["eredmény", "érték", "mért érték"]):
+                if "mérték" not in c_lower and eredmeny_idx == -1: 
+                    eredmeny_idx = idx
+            
+            if "mény" in c_lower and eredmeny_idx == -1: # Split header support
+                eredmeny_idx = idx
+            
+            if any(k in c_lower for k in ["referencia", "ref.", "tartomány"]):
+                ref_idx = idx
+            elif any(k in c_lower for k in ["minősítés", "státusz"]):
+                minosites_idx = idx
+        
+        # Merged Header check
+        if vizsgalat_idx != -1 and eredmeny_idx == -1:
+            if "eredmény" in str(row_texts[vizsgalat_idx]).lower():
+                eredmeny_idx = vizsgalat_idx
+
+        if vizsgalat_idx != -1 and (eredmeny_idx != -1 or ("eredmény" in str(row_texts[vizsgalat_idx]).lower() and vizsgalat_idx == eredmeny_idx)):
+            return i, row_texts, {
+                "v": vizsgalat_idx,
+                "e": eredmeny_idx,
+                "m": mertekegyseg_idx,
+                "r": ref_idx,
+                "f": minosites_idx
+            }
+    return -1, [], None
+
+def parse_row(row, current_map, report):
+    """Parses one data row into a result entry, or None if it is not one."""
+    # Unpack map
+    vizsgalat_idx = current_map["v"]
+    eredmeny_idx = current_map["e"]
+    mertekegyseg_idx = current_map["m"]
+    ref_idx = current_map["r"]
+    minosites_idx = current_map["f"]
+
+    test_name = ""
+    result_val = ""
+    unit_candidate = None 
+    
+    # Standard case
+    if vizsgalat_idx != eredmeny_idx:
+        if len(row) > max(vizsgalat_idx, eredmeny_idx):
+            test_name = clean_text(row[vizsgalat_idx])
+            result_val = clean_text(row[eredmeny_idx])
+        else:
+            logging.debug(f"Row too short for standard case: {row}")
+            return None
+    
+    # Merged case
+    elif vizsgalat_idx == eredmeny_idx:
+        next_col_idx = vizsgalat_idx + 1
+        split_found = False
+        if len(row) > next_col_idx:
+            next_val = clean_text(row[next_col_idx])
+            if re.match(r'^([<>]?[\d.,]+|Negatív|Pozitív|Neg|Poz|Normál)$', next_val, re.IGNORECASE):
+                test_name = clean_text(row[vizsgalat_idx])
+                result_val = next_val
+                split_found = True
+        
+        if not split_found:
+            raw_text = clean_text(row[vizsgalat_idx])
+            match = re.search(r'^(.*?)\s+([<>]?[\d.,]+)\s*(.*)$', raw_text)
+            if match:
+                test_name = match.group(1).strip()
+                result_val = match.group(2).strip()
+                unit_candidate = match.group(3).strip()
+            else:
+                match_text = re.search(r'^(.*?)\s+(Negatív|Pozitív|Neg|Poz|Normál)\s*(.*)$', raw_text, re.IGNORECASE)
+                if match_text:
+                    test_name = match_text.group(1).strip()
+                    result_val = match_text.group(2).strip()
+                else:
+                    logging.debug(f"Could not parse merged column: {raw_text}")
+                    return None
+
+    if not test_name or not result_val:
+        logging.debug(f"Empty name or result after parsing: name='{test_name}', res='{result_val}'")
+        return None
+        
+    # Initialize entry
+    entry = {
+        "test_name": test_name,
+        "result": result_val,
+        "unit": "",
+        "ref_range": "",
+        "flag": ""
+    }
+    
+    if mertekegyseg_idx != -1 and len(row) > mertekegyseg_idx:
+         entry["unit"] = clean_text(row[mertekegyseg_idx])
+    elif unit_candidate:
+         entry["unit"] = unit_candidate
+    
+    # Ref Range
+    final_ref_str = ""
+    r_min = None
+    r_max = None
+    
+    if ref_idx != -1 and len(row) > ref_idx:
+        candidates = []
+        for offset in range(0, 4):
+            col_i = ref_idx + offset
+            if col_i >= len(row): break
+            if mertekegyseg_idx != -1 and col_i == mertekegyseg_idx: break
+            candidates.append(clean_text(row[col_i]))
+        
+        for i in range(1, len(candidates) + 1):
+            merged = " ".join(candidates[:i])
+            t_min, t_max = parse_ref_range(merged)
+            if t_min is not None or t_max is not None:
+                final_ref_str = merged
+                r_min, r_max = t_min, t_max
+                break
+                
+    if r_min is None and r_max is None:
+        search_start = max(vizsgalat_idx, eredmeny_idx) + 1
+        if mertekegyseg_idx != -1: search_start = max(search_start, mertekegyseg_idx + 1)
+        
+        for col_i in range(search_start, len(row)):
+            val = clean_text(row[col_i])
+            if not val: continue
+            
+            t_min, t_max = parse_ref_range(val)
+            if t_min is not None or t_max is not None:
+                final_ref_str = val
+                r_min, r_max = t_min, t_max
+                break
+
+    entry["ref_range"] = final_ref_str
+    if r_min is not None: entry["ref_min"] = r_min
+    if r_max is not None: entry["ref_max"] = r_max
+
+    if minosites_idx != -1 and len(row) > minosites_idx:
+        entry["flag"] = clean_text(row[minosites_idx])
+    elif "+" in result_val or "*" in result_val:
+        if result_val.endswith("+") or result_val.endswith("*") or result_val.endswith("-"):
+             entry["flag"] = result_val[-1]
+
+    # Simplify Test Name
+    test_name = test_name.strip().rstrip(".:")
+    test_name = re.sub(r'\s*\(A\).*$', '', test_name, flags=re.IGNORECASE)
+    
+    # Short name filter (Garbage collection)
+    if len(test_name) < 2 or test_name.replace('.','').replace('-','').isdigit():
+        logging.debug(f"Skipping short/numeric name: {test_name}")
+        return None
+
+    
+    # IgE Filtering
+    if "ige" in test_name.lower():
+        is_total = any(k in test_name.lower() for k in ["immunglobulin di", "immunglobulin e", "totál", "teljes", "összes"])
+        if not is_total:
+             logging.debug(f"Skipping IgE variant: {test_name}")
+             return None
+
+    # Noise filtering
+    # Check both name and result for noise
+    noise_start = time.perf_counter()
+    is_noise = any(p in test_name.lower() or p in result_val.lower() for p in NOISE_PHRASES)
+    report.add_time("noise_filtering", time.perf_counter() - noise_start)
+    if is_noise:
+        logging.debug(f"Skipping noise row: {test_name} - {result_val}")
+        report.count("rows_noise")
+        return None
+
+    # Unit check in result
+    if result_val in UNIT_VALUES:
+         if eredmeny_idx > 0: # Try Left
+             prev_val = clean_text(row[eredmeny_idx - 1])
+             if re.match(r'^[<>]?[\d.,]+$', prev_val):
+                 entry["unit"] = result_val
+                 result_val = prev_val
+         if result_val in UNIT_VALUES:
+             logging.debug(f"Result value is a unit, skipping: {result_val}")
+             return None 
+
+    return entry
+
+def parse_table(table, active_header_map, report):
+    """Parses one extracted table.
+
+    Returns (entries, active_header_map); tables without their own header
+    reuse the map of the last header seen, which is how tables continuing
+    across pages are picked up.
+    """
+    if not table:
+        return [], active_header_map
+    report.count("tables")
+
+    # Heuristic: Identify header row
+    with report.stage("header_detection"):
+        header_idx, headers, found_header_map = find_header(table)
+    
+    # Determine usage map
+    current_map = None
+    start_row = 0
+    
+    if found_header_map:
+        current_map = found_header_map
+        active_header_map = found_header_map
+        start_row = header_idx + 1
+        report.count("headers_found")
+        logging.debug(f"HEADERS FOUND: {headers} map: {current_map}")
+    elif active_header_map:
+         # Check if table has enough columns to support validity
+         # At least up to max(v, e)
+         # Also check if the first row is not empty, which might indicate a blank table or separator
+         if not table[0] or not any(clean_text(c) for c in table[0]):
+             logging.debug("Skipping empty or separator table.")
+             report.count("tables_skipped")
+             return [], active_header_map
+
+         req_cols = max(active_header_map["v"], active_header_map["e"])
+         if len(table[0]) > req_cols:
+             current_map = active_header_map
+             start_row = 0
+             report.count("inherited_maps")
+             logging.debug(f"Using inherited header map for table starting: {[clean_text(c) for c in table[0][:3]]}...")
+         else:
+             logging.debug(f"Table too narrow ({len(table[0])} cols) for inherited map (needs {req_cols+1} cols), skipping. First row: {[clean_text(c) for c in table[0]]}")
+             report.count("tables_skipped")
+             return [], active_header_map
+    else:
+         if len(table) > 0:
+             logging.debug(f"Skipped table (no header), first row: {[clean_text(c) for c in table[0]]}")
+         report.count("tables_skipped")
+         return [], active_header_map
+
+    # Process data rows
+    entries = []
+    with report.stage("row_parsing"):
+        for row in table[start_row:]:
+            if not row: continue
+            report.count("rows")
+            entry = parse_row(row, current_map, report)
+            if entry is not None:
+                entries.append(entry)
+    return entries, active_header_map
+
+def extract_page_tables(page, report):
+    tables = []
+    for name, settings in TABLE_STRATEGIES:
+        with report.stage(f"extract_tables[{name}]"):
+            extracted = page.extract_tables(settings)
+        if extracted:
+            tables.extend(extracted)
+    return tables
+
+@lru_cache(maxsize=None)
+def normalize_test_name(t_name):
+    """Maps a raw test name onto VALID_TEST_NAMES.
+
+    Memoized: the fuzzy match is by far the costliest step per result and
+    the same raw names recur in every report, so a long-lived process
+    (batch runner worker, service) builds this index up once.
+    """
+    # Hard cleanup of (A)
+    # remove (A) case insensitive from end
+    t_name = re.sub(r'\s*\(A\).*$', '', t_name, flags=re.IGNORECASE).strip()
+    
+    # Explicit mapping cleanup
+    t_lower = t_name.lower()
+    if "vas (fe)" in t_lower: t_name = "Vas (Fe)"
+    elif "fehérvérsejtszám" in t_lower: t_name = "Fehérvérsejtszám"
+    elif "vörösvérsejtszám" in t_lower: t_name = "Vörösvérsejtszám"
+    elif "hemoglobin" in t_lower and "vizelet" not in t_lower: t_name = "Hemoglobin"
+    elif "hematokrit" in t_lower: t_name = "Hematokrit"
+    elif "trombocitaszám" in t_lower: t_name = "Trombocitaszám"
+    
+    # Fuzzy match against VALID_TEST_NAMES
+    # If we find a close match, replace it.
+    # We look for the best match with a high similarity threshold.
+    # This helps normalize "Albumin (se)" to "Albumin" etc.
+    
+    best_match = None
+    highest_ratio = 0.0
+    
+    # Check for exact containment first (case insensitive)
+    for valid_name in VALID_TEST_NAMES:
+        # Check exact match
+        if valid_name.lower() == t_name.lower():
+            best_match = valid_name
+            highest_ratio = 1.0
+            break
+        
+        # Check if valid_name is a substring of cleaned name or vice versa?
+        # Usually strict substring is safe if long enough.
+        # But let's use SequenceMatcher for robustness
+        ratio = difflib.SequenceMatcher(None, t_name.lower(), valid_name.lower()).ratio()
+        if ratio > highest_ratio:
+            highest_ratio = ratio
+            best_match = valid_name
+    
+    # Threshold for fuzzy matching
+    # If > 0.85, we assume it's the same.
+    # OR if one is substring of another and length difference is small?
+    if highest_ratio > 0.85:
+        t_name = best_match
+    else:
+         # Fallback check: is valid_name inside t_name?
+         # e.g. "Sszes Albumin" (garbage) -> Albumin
+         # e.g. "Albumin." -> Albumin
+         found_contained = None
+         for valid_name in VALID_TEST_NAMES:
+             if valid_name.lower() in t_name.lower():
+                 # Only if valid_name is significant length
+                 if len(valid_name) > 3:
+                     # Prefer the longest match
+                     if found_contained is None or len(valid_name) > len(found_contained):
+                         found_contained = valid_name
+         
+         if found_contained:
+             t_name = found_contained
+
+    return t_name
+
+def normalize_results(results, report):
+    # Final Cleanup Pass
+    cleaned_results = []
+    
+    with report.stage("name_normalization"):
+        for entry in results:
+            entry["test_name"] = normalize_test_name(entry["test_name"])
+            
+            # Clean unit if it ended up in result (double check)
+            if entry["unit"] == "" and entry["result"] in ["umol/L", "mmol/L", "g/L"]:
+                 # This is a bad parse, skip or fix?
+                 pass 
+
+            cleaned_results.append(entry)
+
+    return cleaned_results
+
+def process_pages(pdf, active_header_map, report, results, max_rss_mb=None, ocr_rows=None):
+    """Parses pdf.pages in order, dropping each page's caches once it is done.
+
+    Returns (active_header_map, pages processed). With max_rss_mb it stops
+    after the first page that leaves the process above the ceiling.
+    ocr_rows ({page index: rows}) replaces table extraction for scanned pages.
+    """
+    done = 0
+    for page in pdf.pages:
+        report.count("pages")
+        if ocr_rows and page.page_number - 1 in ocr_rows:
+            tables = [ocr_rows[page.page_number - 1]]
+        else:
+            # Try multiple extraction strategies
+            tables = extract_page_tables(page, report)
+        for table in tables:
+            entries, active_header_map = parse_table(table, active_header_map, report)
+            for entry in entries:
+                if entry not in results:
+                    results.append(entry)
+        # Layout objects, chars and table candidates are cached on the page
+        page.close()
+        done += 1
+        if max_rss_mb and current_rss_mb() > max_rss_mb:
+            break
+    return active_header_map, done
+
+def _extract_window(filepath, first_page, last_page, active_header_map, max_rss_mb, ocr_opts=None):
+    """Worker for bounded mode: parses pages [first_page, last_page) of a memory-mapped file.
+
+    Scanned pages of the window are detected and OCR'd here too, in-process
+    (pool workers are daemonic and can't start an OCR pool), so no step
+    ever looks at more than one window of the document.
+    """
+    import pdfplumber
+
+    report = RunReport()
+    results = []
+    with ExitStack() as stack:
+        source = open_document(filepath)
+        # Packed documents already are a slice of a memory-mapped pack
+        if isinstance(source, str):
+            f = stack.enter_context(open(source, 'rb'))
+            source = stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        with report.stage("pdf_open"):
+            pdf = pdfplumber.open(source, pages=list(range(first_page + 1, last_page + 1)))
+        with pdf:
+            ocr_rows = ocr_textless_pages(pdf, report, workers=1, **ocr_opts) if ocr_opts is not None else None
+            active_header_map, done = process_pages(pdf, active_header_map, report, results, max_rss_mb, ocr_rows)
+    report.max_gauge("worker_peak_rss_mb", round(peak_rss_mb(), 1))
+    return results, active_header_map, first_page + done, report.to_dict()
+
+def _extract_bounded(filepath, report, results, max_rss_mb, page_window, ocr_opts=None):
+    import pdfplumber
+    import multiprocessing
+
+    with report.stage("pdf_open"):
+        pdf = pdfplumber.open(open_document(filepath))
+    with pdf:
+        n_pages = len(pdf.pages)
+    if ocr_opts is not None:
+        # Checked (and logged) once here rather than in every window worker
+        ocr_opts = {"cache_dir": ocr_opts["cache_dir"], "tesseract": tesseract_available()}
+
+    # One fresh process per window (maxtasksperchild=1), so whatever the
+    # parser allocated is returned to the OS before the next window starts.
+    # The header map is carried over so tables continuing across a window
+    # boundary are still recognised.
+    active_header_map = None
+    page = 0
+    window = page_window
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        while page < n_pages:
+            stop = min(page + window, n_pages)
+            window_results, active_header_map, next_page, worker_report = pool.apply(
+                _extract_window, (filepath, page, stop, active_header_map, max_rss_mb, ocr_opts))
+            report.merge(worker_report)
+            report.count("page_windows")
+            for entry in window_results:
+                if entry not in results:
+                    results.append(entry)
+            if next_page < stop:
+                window = max(1, next_page - page)
+                report.count("rss_ceiling_hits")
+                logging.warning(f"RSS ceiling of {max_rss_mb} MB reached at page {next_page} of {filepath}, "
+                                f"continuing with {window}-page windows")
+            page = next_page
+
+def extract_from_pdf(filepath, report=None, max_rss_mb=None, page_window=DEFAULT_PAGE_WINDOW,
+                     ocr=True, ocr_workers=None, ocr_cache_dir=DEFAULT_OCR_CACHE_DIR):
+    """Extracts result entries from one PDF.
+
+    With max_rss_mb set the file is parsed in page windows by recycled
+    worker processes so memory stays bounded regardless of document length.
+    With ocr, pages without a text layer go through the Tesseract fallback
+    (ocr_workers=1 keeps it in-process, e.g. inside a pool worker; bounded
+    mode always OCRs in-process, one window at a time).
+    """
+    report = report or get_report()
     results = []
     
     try:
@@ -128,434 +597,160 @@ def extract_from_pdf(filepath):
         return []
 
     logging.info(f"Processing: {filepath}")
+    report.count("documents")
     
+    ocr_opts = {"workers": ocr_workers, "cache_dir": ocr_cache_dir} if ocr else None
     try:
-        with pdfplumber.open(filepath) as pdf:
-            active_header_map = None # Form: {v: idx, e: idx, m: idx, r: idx, f: idx}
-            
-            for page in pdf.pages:
-                # Try multiple extraction strategies
-                strategies = [
-                    {}, # Default (lines)
-                    {"vertical_strategy": "text", "horizontal_strategy": "text"}, # Whitespace
-                ]
-                
-                tables = []
-                for settings in strategies:
-                    extracted = page.extract_tables(settings)
-                    if extracted:
-                        tables.extend(extracted)
-                
-                for table in tables:
-                    if not table: continue
-
-                    # Heuristic: Identify header row
-                    header_idx = -1
-                    headers = []
-                    
-                    found_header_map = None
-
-                    for i, row in enumerate(table):
-                        # Clean row content
-                        row_texts = [clean_text(cell) for cell in row]
-                        
-                        vizsgalat_idx = -1
-                        eredmeny_idx = -1
-                        mertekegyseg_idx = -1
-                        ref_idx = -1
-                        minosites_idx = -1
-                        
-                        # Identify columns in this row
-                        for idx, cell in enumerate(row_texts):
-                            c_lower = cell.lower()
-                            
-                            if any(k in c_lower for k in ["vizsgálat", "megnevezés", "teszt"]):
-                                if vizsgalat_idx == -1: vizsgalat_idx = idx
-                            
-                            if "mértékegység" in c_lower or "m.e." in c_lower or "egység" in c_lower:
-                                mertekegyseg_idx = idx
-                                continue
-
-                            if any(k in c_lower for k in ["eredmény", "érték", "mért érték"]):
-                                if "mérték" not in c_lower and eredmeny_idx == -1: 
-                                    eredmeny_idx = idx
-                            
-                            if "mény" in c_lower and eredmeny_idx == -1: # Split header support
-                                eredmeny_idx = idx
-                            
-                            if any(k in c_lower for k in ["referencia", "ref.", "tartomány"]):
-                                ref_idx = idx
-                            elif any(k in c_lower for k in ["minősítés", "státusz"]):
-                                minosites_idx = idx
-                        
-                        # Merged Header check
-                        if vizsgalat_idx != -1 and eredmeny_idx == -1:
-                            if "eredmény" in str(row_texts[vizsgalat_idx]).lower():
-                                eredmeny_idx = vizsgalat_idx
-
-                        if vizsgalat_idx != -1 and (eredmeny_idx != -1 or ("eredmény" in str(row_texts[vizsgalat_idx]).lower() and vizsgalat_idx == eredmeny_idx)):
-                            header_idx = i
-                            headers = row_texts
-                            found_header_map = {
-                                "v": vizsgalat_idx,
-                                "e": eredmeny_idx,
-                                "m": mertekegyseg_idx,
-                                "r": ref_idx,
-                                "f": minosites_idx
-                            }
-                            break
-                    
-                    # Determine usage map
-                    current_map = None
-                    start_row = 0
-                    
-                    if found_header_map:
-                        current_map = found_header_map
-                        active_header_map = found_header_map
-                        start_row = header_idx + 1
-                        logging.info(f"HEADERS FOUND: {headers} map: {current_map}")
-                    elif active_header_map:
-                         # Check if table has enough columns to support validity
-                         # At least up to max(v, e)
-                         # Also check if the first row is not empty, which might indicate a blank table or separator
-                         if not table[0] or not any(clean_text(c) for c in table[0]):
-                             logging.debug("Skipping empty or separator table.")
-                             continue
-
-                         req_cols = max(active_header_map["v"], active_header_map["e"])
-                         if len(table[0]) > req_cols:
-                             current_map = active_header_map
-                             start_row = 0
-                             logging.info(f"Using inherited header map for table starting: {[clean_text(c) for c in table[0][:3]]}...")
-                         else:
-                             logging.debug(f"Table too narrow ({len(table[0])} cols) for inherited map (needs {req_cols+1} cols), skipping. First row: {[clean_text(c) for c in table[0]]}")
-                             continue
-                    else:
-                         if len(table) > 0:
-                             logging.info(f"Skipped table (no header), first row: {[clean_text(c) for c in table[0]]}")
-                         continue
-
-                    # Unpack map
-                    vizsgalat_idx = current_map["v"]
-                    eredmeny_idx = current_map["e"]
-                    mertekegyseg_idx = current_map["m"]
-                    ref_idx = current_map["r"]
-                    minosites_idx = current_map["f"]
-
-                    # Process data rows
-                    for row in table[start_row:]:
-                        if not row: continue
-
-                        test_name = ""
-                        result_val = ""
-                        unit_candidate = None 
-                        
-                        # Standard case
-                        if vizsgalat_idx != eredmeny_idx:
-                            if len(row) > max(vizsgalat_idx, eredmeny_idx):
-                                test_name = clean_text(row[vizsgalat_idx])
-                                result_val = clean_text(row[eredmeny_idx])
-                            else:
-                                logging.debug(f"Row too short for standard case: {row}")
-                                continue
-                        
-                        # Merged case
-                        elif vizsgalat_idx == eredmeny_idx:
-                            next_col_idx = vizsgalat_idx + 1
-                            split_found = False
-                            if len(row) > next_col_idx:
-                                next_val = clean_text(row[next_col_idx])
-                                if re.match(r'^([<>]?[\d.,]+|Negatív|Pozitív|Neg|Poz|Normál)$', next_val, re.IGNORECASE):
-                                    test_name = clean_text(row[vizsgalat_idx])
-                                    result_val = next_val
-                                    split_found = True
-                            
-                            if not split_found:
-                                raw_text = clean_text(row[vizsgalat_idx])
-                                match = re.search(r'^(.*?)\s+([<>]?[\d.,]+)\s*(.*)$', raw_text)
-                                if match:
-                                    test_name = match.group(1).strip()
-                                    result_val = match.group(2).strip()
-                                    unit_candidate = match.group(3).strip()
-                                else:
-                                    match_text = re.search(r'^(.*?)\s+(Negatív|Pozitív|Neg|Poz|Normál)\s*(.*)$', raw_text, re.IGNORECASE)
-                                    if match_text:
-                                        test_name = match_text.group(1).strip()
-                                        result_val = match_text.group(2).strip()
-                                    else:
-                                        logging.debug(f"Could not parse merged column: {raw_text}")
-                                        continue
-
-                        if not test_name or not result_val:
-                            logging.debug(f"Empty name or result after parsing: name='{test_name}', res='{result_val}'")
-                            continue
-                            
-                        # Initialize entry
-                        entry = {
-                            "test_name": test_name,
-                            "result": result_val,
-                            "unit": "",
-                            "ref_range": "",
-                            "flag": ""
-                        }
-                        
-                        if mertekegyseg_idx != -1 and len(row) > mertekegyseg_idx:
-                             entry["unit"] = clean_text(row[mertekegyseg_idx])
-                        elif unit_candidate:
-                             entry["unit"] = unit_candidate
-                        
-                        # Ref Range
-                        final_ref_str = ""
-                        r_min = None
-                        r_max = None
-                        
-                        if ref_idx != -1 and len(row) > ref_idx:
-                            candidates = []
-                            for offset in range(0, 4):
-                                col_i = ref_idx + offset
-                                if col_i >= len(row): break
-                                if mertekegyseg_idx != -1 and col_i == mertekegyseg_idx: break
-                                candidates.append(clean_text(row[col_i]))
-                            
-                            for i in range(1, len(candidates) + 1):
-                                merged = " ".join(candidates[:i])
-                                t_min, t_max = parse_ref_range(merged)
-                                if t_min is not None or t_max is not None:
-                                    final_ref_str = merged
-                                    r_min, r_max = t_min, t_max
-                                    break
-                                    
-                        if r_min is None and r_max is None:
-                            search_start = max(vizsgalat_idx, eredmeny_idx) + 1
-                            if mertekegyseg_idx != -1: search_start = max(search_start, mertekegyseg_idx + 1)
-                            
-                            for col_i in range(search_start, len(row)):
-                                val = clean_text(row[col_i])
-                                if not val: continue
-                                
-                                t_min, t_max = parse_ref_range(val)
-                                if t_min is not None or t_max is not None:
-                                    final_ref_str = val
-                                    r_min, r_max = t_min, t_max
-                                    break
-
-                        entry["ref_range"] = final_ref_str
-                        if r_min is not None: entry["ref_min"] = r_min
-                        if r_max is not None: entry["ref_max"] = r_max
-
-                        if minosites_idx != -1 and len(row) > minosites_idx:
-                            entry["flag"] = clean_text(row[minosites_idx])
-                        elif "+" in result_val or "*" in result_val:
-                            if result_val.endswith("+") or result_val.endswith("*") or result_val.endswith("-"):
-                                 entry["flag"] = result_val[-1]
-
-                        # Simplify Test Name
-                        test_name = test_name.strip().rstrip(".:")
-                        test_name = re.sub(r'\s*\(A\).*$', '', test_name, flags=re.IGNORECASE)
-                        
-                        # Short name filter (Garbage collection)
-                        if len(test_name) < 2 or test_name.replace('.','').replace('-','').isdigit():
-                            logging.debug(f"Skipping short/numeric name: {test_name}")
-                            continue
-
-                        
-                        # IgE Filtering
-                        if "ige" in test_name.lower():
-                            is_total = any(k in test_name.lower() for k in ["immunglobulin di", "immunglobulin e", "totál", "teljes", "összes"])
-                            if not is_total:
-                                 logging.debug(f"Skipping IgE variant: {test_name}")
-                                 continue
-
-                        # Noise filtering
-                        noise_phrases = ["laboratóriumi lelet", "validálók", "oldal:", "hiteles", "amennyiben egy vizsgálatnál", "készült", "dátuma:", "időpontja:", "synlab", "leletnyo", "érvényes", "dr.", "főorvos", "belgyógyász", "asszisztens", "telefon", "fax", "email", "e-mail", "utc", "tér", "kerület", "emelet", "ajtó", "szakrendelő", "kórház", "laboratórium", "időpont", "honlap", "ügyfélszolgálat", "járóbeteg", "beutaló"]
-                        
-                        # Check both name and result for noise
-                        if any(p in test_name.lower() or p in result_val.lower() for p in noise_phrases):
-                            logging.debug(f"Skipping noise row: {test_name} - {result_val}")
-                            continue
-
-                        # Unit check in result
-                        if result_val in ["Giga/L", "Tera/L", "g/L", "L/L", "fL", "pg", "%", "mmol/L", "umol/L", "kU/L", "U/L", "IU/mL"]:
-                             if eredmeny_idx > 0: # Try Left
-                                 prev_val = clean_text(row[eredmeny_idx - 1])
-                                 if re.match(r'^[<>]?[\d.,]+$', prev_val):
-                                     entry["unit"] = result_val
-                                     result_val = prev_val
-                             if result_val in ["Giga/L", "Tera/L", "g/L", "L/L", "fL", "pg", "%", "mmol/L", "umol/L", "kU/L", "U/L", "IU/mL"]:
-                                 logging.debug(f"Result value is a unit, skipping: {result_val}")
-                                 continue 
-
-                        if entry not in results:
-                            results.append(entry)
+        if max_rss_mb:
+            _extract_bounded(filepath, report, results, max_rss_mb, page_window, ocr_opts)
+        else:
+            with report.stage("pdf_open"):
+                pdf = pdfplumber.open(open_document(filepath))
+            with pdf:
+                ocr_rows = ocr_textless_pages(pdf, report, **ocr_opts) if ocr else None
+                active_header_map = None # Form: {v: idx, e: idx, m: idx, r: idx, f: idx}
+                process_pages(pdf, active_header_map, report, results, ocr_rows=ocr_rows)
 
     except Exception as e:
         logging.error(f"Error parsing PDF {filepath}: {e}")
+        report.count("documents_failed")
     
-    # Final Cleanup Pass
-    cleaned_results = []
-    seen_tests = set()
-    
-    for entry in results:
-        t_name = entry["test_name"]
-        
-        # Hard cleanup of (A)
-        # remove (A) case insensitive from end
-        t_name = re.sub(r'\s*\(A\).*$', '', t_name, flags=re.IGNORECASE).strip()
-        
-        # Explicit mapping cleanup
-        t_lower = t_name.lower()
-        if "vas (fe)" in t_lower: t_name = "Vas (Fe)"
-        elif "fehérvérsejtszám" in t_lower: t_name = "Fehérvérsejtszám"
-        elif "vörösvérsejtszám" in t_lower: t_name = "Vörösvérsejtszám"
-        elif "hemoglobin" in t_lower and "vizelet" not in t_lower: t_name = "Hemoglobin"
-        elif "hematokrit" in t_lower: t_name = "Hematokrit"
-        elif "trombocitaszám" in t_lower: t_name = "Trombocitaszám"
-        
-        # Fuzzy match against VALID_TEST_NAMES
-        # If we find a close match, replace it.
-        # We look for the best match with a high similarity threshold.
-        # This helps normalize "Albumin (se)" to "Albumin" etc.
-        
-        best_match = None
-        highest_ratio = 0.0
-        
-        # Check for exact containment first (case insensitive)
-        for valid_name in VALID_TEST_NAMES:
-            # Check exact match
-            if valid_name.lower() == t_name.lower():
-                best_match = valid_name
-                highest_ratio = 1.0
-                break
-            
-            # Check if valid_name is a substring of cleaned name or vice versa?
-            # Usually strict substring is safe if long enough.
-            # But let's use SequenceMatcher for robustness
-            ratio = difflib.SequenceMatcher(None, t_name.lower(), valid_name.lower()).ratio()
-            if ratio > highest_ratio:
-                highest_ratio = ratio
-                best_match = valid_name
-        
-        # Threshold for fuzzy matching
-        # If > 0.85, we assume it's the same.
-        # OR if one is substring of another and length difference is small?
-        if highest_ratio > 0.85:
-            t_name = best_match
-        else:
-             # Fallback check: is valid_name inside t_name?
-             # e.g. "Sszes Albumin" (garbage) -> Albumin
-             # e.g. "Albumin." -> Albumin
-             found_contained = None
-             for valid_name in VALID_TEST_NAMES:
-                 if valid_name.lower() in t_name.lower():
-                     # Only if valid_name is significant length
-                     if len(valid_name) > 3:
-                         # Prefer the longest match
-                         if found_contained is None or len(valid_name) > len(found_contained):
-                             found_contained = valid_name
-             
-             if found_contained:
-                 t_name = found_contained
-
-        entry["test_name"] = t_name
-        
-        # Clean unit if it ended up in result (double check)
-        if entry["unit"] == "" and entry["result"] in ["umol/L", "mmol/L", "g/L"]:
-             # This is a bad parse, skip or fix?
-             pass 
-
-        cleaned_results.append(entry)
-
+    cleaned_results = normalize_results(results, report)
+    report.count("results", len(cleaned_results))
     return cleaned_results
 
 def save_to_js(json_data, output_path="web_app/data.js"):
     """Saves the JSON data as a Javascript variable for local usage."""
     js_content = f"const bloodData = {json.dumps(json_data, indent=4, ensure_ascii=False)};"
-    
-    # Ensure directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(js_content)
+    write_text_atomic(output_path, js_content)
     logging.info(f"Generated {output_path}")
 
-def main():
-    manifest = load_manifest()
+def write_outputs(all_data, out_dir=".", report=None, db=None):
+    """Analytics, blood_results.json, web_app/data.js, versioned deltas (plus SQLite) for one archive."""
+    report = report or get_report()
+
+    # Bulk status/trend evaluation (adds "status" to every result)
+    with report.stage("analytics"):
+        analytics = analyze(all_data)
+    if analytics is not None:
+        save_report(analytics, os.path.join(out_dir, "blood_analytics.json"))
+        logging.info(f"{len(analytics['alerts'])} results newly out of range.")
+
+    # Save to JSON
+    output_file = os.path.join(out_dir, "blood_results.json")
+    with report.stage("serialization"):
+        write_json_atomic(output_file, all_data)
+        
+        logging.info(f"Successfully exported data to {output_file}")
+        
+        # Save to JS for web app
+        save_to_js(all_data, os.path.join(out_dir, "web_app", "data.js"))
+
+    # Base snapshot + deltas so consumers can sync without the full history
+    with report.stage("versioning"):
+        publish(all_data, os.path.join(out_dir, DEFAULT_VERSIONS_DIR))
+
+    if db:
+        with report.stage("sqlite"):
+            write_results(all_data, db, root=out_dir)
+
+def extract_documents(docs, report, skip_paths=(), **extract_opts):
+    """Extracts each manifest document on its own, keeping its metadata."""
     all_data = []
-    
-    # Filter for labor results
-    # Heuristic: "labor" in type or filename, or Synlab
-    target_docs = [
-        d for d in manifest 
-        if "labor" in d.get('type', '').lower() 
-        or "labor" in d.get('filepath', '').lower()
-        or "Synlab" in d.get('institution', '')
-    ]
-    
-    logging.info(f"Found {len(target_docs)} potential laboratory documents.")
-    
-    # Process merged_medical_history.pdf specifically
-    merged_pdf_path = os.path.abspath("merged_medical_history.pdf")
-    
-    if os.path.exists(merged_pdf_path):
-        logging.info(f"Processing merged PDF: {merged_pdf_path}")
-        extracted_results = extract_from_pdf(merged_pdf_path)
+    for doc in docs:
+        filepath = doc.get('filepath')
+        if not filepath or not document_exists(filepath):
+            logging.warning(f"Listed in manifest but missing: {filepath}")
+            report.count("documents_missing")
+            continue
+        
+        if os.path.abspath(filepath) in skip_paths:
+            continue
+
+        extracted_results = extract_from_pdf(filepath, report, **extract_opts)
+        
         if extracted_results:
-             # Create a pseudo-doc record since we don't have manifest metadata for this manually created file
             doc_record = {
-                "metadata": {
-                    "lastModified": datetime.now().isoformat(),
-                    "filepath": merged_pdf_path,
-                    "institution": "Merged Document",
-                    "type": "Laboratóriumi lelet"
-                },
+                "metadata": doc,
                 "results": extracted_results
             }
             all_data.append(doc_record)
-            logging.info(f"Extracted {len(extracted_results)} results from {merged_pdf_path}")
-        else:
-             logging.warning(f"No results extracted from {merged_pdf_path}")
-    else:
-        logging.error(f"Merged PDF not found at: {merged_pdf_path}")
-
-    # Optionally process other docs if needed, but user emphasized the merged one.
-    # We will keep the original loop but filter out if it touches the same content or if user wants ONLY the merged one.
-    # Assuming the merged PDF contains everything, we might want to skip the manifest loop or keep it as backup.
-    # Given the user instruction "That one should get the information from the merge_medical_history.pdf", 
-    # implies this is the primary source.
-    # To be safe, we'll process the manifest too ONLY IF merged pdf didn't yield results or if we want everything.
-    # But usually merged pdf implies we just want that. Let's comment out the manifest loop to avoid duplicates if the merged pdf is working.
-    # Actually, the user's workspace shows the file exists.
-    
-    if not all_data:
-        logging.info("Fallback: Checking manifest for other labor documents...")
-        for doc in target_docs:
-            filepath = doc.get('filepath')
-            if not filepath or not os.path.exists(filepath):
-                continue
-            
-            # Skip if it's the extracted merged file itself (unlikely but possible)
-            if os.path.abspath(filepath) == merged_pdf_path:
-                continue
+            logging.info(f"Extracted {len(extracted_results)} results from {filepath}")
+    return all_data
 
-            extracted_results = extract_from_pdf(filepath)
-            
-            if extracted_results:
-                doc_record = {
-                    "metadata": doc,
-                    "results": extracted_results
-                }
-                all_data.append(doc_record)
-                logging.info(f"Extracted {len(extracted_results)} results from {filepath}")
+def extract_merged(merged_pdf_path, report, **extract_opts):
+    extracted_results = extract_from_pdf(merged_pdf_path, report, **extract_opts)
+    if not extracted_results:
+        logging.warning(f"No results extracted from {merged_pdf_path}")
+        return []
+    logging.info(f"Extracted {len(extracted_results)} results from {merged_pdf_path}")
+    # Create a pseudo-doc record since we don't have manifest metadata for this manually created file
+    return [{
+        "metadata": {
+            "lastModified": datetime.now().isoformat(),
+            "filepath": merged_pdf_path,
+            "institution": "Merged Document",
+            "type": "Laboratóriumi lelet"
+        },
+        "results": extracted_results
+    }]
+
+def run_extraction(args, report):
+    manifest = load_manifest()
+    target_docs = select_lab_documents(manifest, args.since, args.until)
+    logging.info(f"Found {len(target_docs)} potential laboratory documents.")
 
-    # Save to JSON
-    output_file = "blood_results.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(all_data, f, indent=4, ensure_ascii=False)
-    
-    logging.info(f"Successfully exported data to {output_file}")
-    
-    # Save to JS for web app
-    save_to_js(all_data)
+    merged_pdf_path = os.path.abspath("merged_medical_history.pdf")
+    extract_opts = {"max_rss_mb": args.max_rss_mb, "page_window": args.page_window,
+                    "ocr": not args.no_ocr, "ocr_workers": args.ocr_workers, "ocr_cache_dir": args.ocr_cache_dir}
+    all_data = []
+
+    if args.source == "merged":
+        # Legacy path: one re-parse of the output of merge_pdfs.py. Every
+        # result ends up under a single pseudo-document without date/institution.
+        if os.path.exists(merged_pdf_path):
+            logging.info(f"Processing merged PDF: {merged_pdf_path}")
+            all_data = extract_merged(merged_pdf_path, report, **extract_opts)
+        else:
+            logging.error(f"Merged PDF not found at: {merged_pdf_path}")
+        if not all_data:
+            logging.info("Fallback: Checking manifest for other labor documents...")
+            all_data = extract_documents(target_docs, report, skip_paths={merged_pdf_path}, **extract_opts)
+    else:
+        # Straight from EESZT_Archive, so every result keeps its document's
+        # real date and institution and merge_pdfs.py is not needed.
+        all_data = extract_documents(target_docs, report, skip_paths={merged_pdf_path}, **extract_opts)
+
+    write_outputs(all_data, report=report, db=args.db)
+    if report.counters["ocr_pages"]:
+        logging.info(f"OCR fallback: {report.counters['ocr_pages']} scanned pages, "
+                     f"{report.counters['ocr_cache_hits']} from cache, "
+                     f"{report.stages.get('ocr', {}).get('seconds', 0.0):.1f}s in Tesseract")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract blood test results from EESZT PDFs.")
+    parser.add_argument("--source", choices=["manifest", "merged"], default="manifest",
+                        help="Extract the manifest's lab documents directly (default) or merged_medical_history.pdf")
+    parser.add_argument("--db", help="Also upsert the results into this SQLite store")
+    parser.add_argument("--since", help="Only documents dated on/after this (YYYY, YYYY-MM or YYYY-MM-DD)")
+    parser.add_argument("--until", help="Only documents dated on/before this (YYYY, YYYY-MM or YYYY-MM-DD)")
+    parser.add_argument("--max-rss-mb", type=float,
+                        help="Bounded-memory mode: parse in page windows on recycled workers under this RSS ceiling")
+    parser.add_argument("--page-window", type=int, default=DEFAULT_PAGE_WINDOW,
+                        help="Pages per worker in bounded-memory mode")
+    parser.add_argument("--no-ocr", action="store_true", help="Skip the OCR fallback for pages without a text layer")
+    parser.add_argument("--ocr-workers", type=int, help="OCR processes (default: CPU count)")
+    parser.add_argument("--ocr-cache-dir", default=DEFAULT_OCR_CACHE_DIR, help="OCR results by page content hash")
+    parser.add_argument("--report", default="run_report.json", help="Where to write the per-stage timing report")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="Profile the whole run")
+    parser.add_argument("--profile-out", help="Profiler output file")
+    args = parser.parse_args(argv)
+
+    report = new_report()
+    run_profiled(lambda: run_extraction(args, report), args.profile, args.profile_out)
+    if args.report:
+        report.write(args.report)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
     main()
@@ -0,0 +1,337 @@
+import os
+import io
+import json
+import time
+import socket
+import hashlib
+import logging
+import argparse
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from extraction_cache import INCOMPLETE_COUNTERS
+
+# Long-lived extraction service for the web front end's one-PDF uploads.
+# Workers import pdfplumber and fill the test-name normalization cache once
+# at startup (by extracting a few archive reports) instead of per request;
+# results are kept in an in-memory LRU keyed by the PDF's content hash. A
+# pool whose worker died is replaced rather than failing every request.
+#
+#   POST /extract         body: PDF bytes -> extract_from_pdf() JSON list
+#        /extract?cache=0 bypasses the result cache (load testing)
+#   GET  /health          {"status": "ok", ...}
+#   GET  /stats           request counters and latency percentiles
+#
+# Listens on localhost:8765 by default, or on a Unix socket with --socket.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 512
+DEFAULT_QUEUE_TIMEOUT = 30.0
+MAX_BODY_BYTES = 64 * 1024 * 1024
+LATENCY_SAMPLES = 2000
+DEFAULT_WARM_DOCS = 3
+MANIFEST_FILE = "manifest.json"
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0..100) of an unsorted list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def warm_documents(manifest_path=MANIFEST_FILE, limit=DEFAULT_WARM_DOCS):
+    """The newest lab reports of the archive the service runs in, if any."""
+    if not limit or not os.path.exists(manifest_path):
+        return []
+    from archive_pack import document_exists
+    from manifest import load_manifest, select_lab_documents
+
+    docs = select_lab_documents(load_manifest(manifest_path))
+    paths = [d["filepath"] for d in docs if d.get("filepath") and document_exists(d["filepath"])]
+    return paths[-limit:]
+
+
+def _warm_worker(warm_paths=()):
+    """Pool initializer: pays the import and normalization-index cost once per worker.
+
+    Raw names as printed in real reports ("Albumin (se)", ...) are what the
+    normalization cache is keyed by, so the worker extracts a few archive
+    documents rather than feeding it the canonical names.
+    """
+    from extract_blood_results import extract_from_pdf
+    from instrumentation import RunReport
+
+    logging.getLogger().setLevel(logging.WARNING)
+    for path in warm_paths:
+        extract_from_pdf(path, RunReport(), ocr=False)
+
+
+def _ready(delay):
+    time.sleep(delay)
+    return os.getpid()
+
+
+def _extract_bytes(data):
+    from extract_blood_results import extract_from_pdf
+    from instrumentation import RunReport
+
+    report = RunReport()
+    stream = io.BytesIO(data)
+    stream.name = "<upload>"
+    results = extract_from_pdf(stream, report, ocr_workers=1)
+    return results, report.to_dict()
+
+
+class ResultCache:
+    """Thread-safe LRU of extraction results by content hash."""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ExtractionService:
+    def __init__(self, workers=None, max_concurrent=None, cache_size=DEFAULT_CACHE_SIZE,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT, warm_paths=()):
+        self.workers = workers or os.cpu_count() or 1
+        # More in flight than workers only adds queueing inside the pool;
+        # beyond the limit requests wait up to queue_timeout, then get 503.
+        self.max_concurrent = max_concurrent or self.workers
+        self.queue_timeout = queue_timeout
+        self.slots = threading.BoundedSemaphore(self.max_concurrent)
+        self.cache = ResultCache(cache_size)
+        self.warm_paths = list(warm_paths)
+        self.pool = self._new_pool()
+        self._pool_lock = threading.Lock()
+        self.started = time.time()
+        self.stats = {"requests": 0, "cache_hits": 0, "rejected": 0, "failed": 0, "partial": 0, "pool_restarts": 0}
+        self.latencies_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.extract_ms = deque(maxlen=LATENCY_SAMPLES)
+        self._stats_lock = threading.Lock()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker,
+                                   initargs=(self.warm_paths,))
+
+    def _replace_pool(self, broken):
+        # A worker died (crash, OOM kill): the executor refuses all further
+        # work, so start a fresh one. Requests that failed on the same pool
+        # concurrently must not each restart it.
+        with self._pool_lock:
+            if self.pool is not broken:
+                return
+            logging.error("Extraction worker died; restarting the process pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._new_pool()
+        self._count("pool_restarts")
+
+    def warm_up(self):
+        # Start every worker (and run its initializer) before the first
+        # request. Short sleeps keep an already warm worker from draining
+        # the whole round while the others are still importing.
+        start = time.perf_counter()
+        pids = set()
+        while len(pids) < self.workers and time.perf_counter() - start < 120:
+            pids.update(self.pool.map(_ready, [0.05] * self.workers))
+        logging.info(f"{len(pids)} workers warm in {time.perf_counter() - start:.2f}s")
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def extract(self, data, use_cache=True):
+        """(status, results or error, timing dict) for one uploaded PDF."""
+        start = time.perf_counter()
+        self._count("requests")
+        key = hashlib.sha256(data).hexdigest()
+        timing = {"cache": "miss"}
+
+        results = self.cache.get(key) if use_cache else None
+        if results is not None:
+            self._count("cache_hits")
+            timing["cache"] = "hit"
+        else:
+            if not self.slots.acquire(timeout=self.queue_timeout):
+                self._count("rejected")
+                return 503, {"error": "too many concurrent extractions"}, timing
+            try:
+                timing["queue_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                t0 = time.perf_counter()
+                pool = self.pool
+                try:
+                    results, report = pool.submit(_extract_bytes, data).result()
+                except BrokenProcessPool:
+                    self._replace_pool(pool)
+                    raise
+                timing["extract_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+                timing["stages"] = report.get("stages", {})
+                if report["counters"].get("documents_failed"):
+                    # extract_from_pdf logs and returns [] for unreadable files
+                    self._count("failed")
+                    return 422, {"error": "could not parse the PDF"}, timing
+            except Exception as e:
+                self._count("failed")
+                logging.error(f"Extraction failed: {e}")
+                return 500, {"error": str(e)}, timing
+            finally:
+                self.slots.release()
+            if any(report["counters"].get(name) for name in INCOMPLETE_COUNTERS):
+                # e.g. scanned pages skipped without Tesseract: not worth keeping
+                self._count("partial")
+            else:
+                self.cache.put(key, results)
+
+        timing["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        with self._stats_lock:
+            self.latencies_ms.append(timing["total_ms"])
+            if "extract_ms" in timing:
+                self.extract_ms.append(timing["extract_ms"])
+        return 200, results, timing
+
+    def summary(self):
+        with self._stats_lock:
+            latencies = list(self.latencies_ms)
+            extract = list(self.extract_ms)
+            stats = dict(self.stats)
+        return {
+            **stats,
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "workers": self.workers,
+            "max_concurrent": self.max_concurrent,
+            "cached_documents": len(self.cache),
+            "latency_ms": {q: percentile(latencies, n) for q, n in (("p50", 50), ("p90", 90), ("p99", 99))},
+            "extract_ms": {q: percentile(extract, n) for q, n in (("p50", 50), ("p90", 90), ("p99", 99))},
+        }
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+class ExtractionHandler(BaseHTTPRequestHandler):
+    service = None  # set by make_server
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "workers": self.service.workers})
+        elif self.path == "/stats":
+            self._send_json(200, self.service.summary())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        path, _, query = self.path.partition("?")
+        if path != "/extract":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self._send_json(400, {"error": "empty body; POST the PDF bytes"})
+            return
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {"error": f"PDF larger than {MAX_BODY_BYTES // (1024 * 1024)} MB"})
+            return
+        data = self.rfile.read(length)
+        status, payload, timing = self.service.extract(data, use_cache="cache=0" not in query)
+        headers = {"X-Cache": timing["cache"], "X-Total-Ms": str(timing.get("total_ms", ""))}
+        if "extract_ms" in timing:
+            headers["X-Extract-Ms"] = str(timing["extract_ms"])
+        self._send_json(status, payload, headers)
+        logging.info(f"POST /extract {status} {len(data)} bytes {json.dumps(timing)}")
+
+    def address_string(self):
+        # Unix socket clients have no (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+    handler = type("Handler", (ExtractionHandler,), {"service": service})
+    if unix_socket:
+        return UnixHTTPServer(unix_socket, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve extract_from_pdf over HTTP with warm workers.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--max-concurrent", type=int, help="Extractions in flight (default: workers)")
+    parser.add_argument("--queue-timeout", type=float, default=DEFAULT_QUEUE_TIMEOUT,
+                        help="Seconds a request may wait for a slot before 503")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="Results kept in memory")
+    parser.add_argument("--warm-docs", type=int, default=DEFAULT_WARM_DOCS,
+                        help="Archive lab reports each worker extracts at startup (0 to skip)")
+    args = parser.parse_args(argv)
+
+    service = ExtractionService(args.workers, args.max_concurrent, args.cache_size, args.queue_timeout,
+                                warm_documents(limit=args.warm_docs))
+    service.warm_up()
+    server = make_server(service, args.host, args.port, args.socket)
+    where = args.socket or f"http://{args.host}:{args.port}"
+    logging.info(f"Extraction service listening on {where} ({service.workers} workers, "
+                 f"{service.max_concurrent} concurrent)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopped.")
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
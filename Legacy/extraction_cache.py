@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+import logging
+from functools import lru_cache
+
+from atomic_io import write_json_atomic
+
+DEFAULT_CACHE_DIR = ".extract_cache"
+# A run that bumped one of these produced partial results and is not cached
+INCOMPLETE_COUNTERS = ("documents_failed", "ocr_unavailable")
+
+
+@lru_cache(maxsize=1)
+def extractor_version():
+    """Short hash of the extractor source; a parser change invalidates the cache."""
+    h = hashlib.sha256()
+    for name in ("extract_blood_results.py", "ocr_fallback.py"):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+
+class ExtractionCache:
+    """Extraction results on disk, keyed by the document's content hash."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.root = os.path.join(cache_dir, extractor_version())
+
+    def _path(self, doc_hash):
+        return os.path.join(self.root, doc_hash[:2], doc_hash + ".json")
+
+    def get(self, doc_hash):
+        path = self._path(doc_hash)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def put(self, doc_hash, results):
+        # Several workers may race on the same document
+        write_json_atomic(self._path(doc_hash), results, indent=None)
+
+
+def extract_cached(filepath, cache, report, **extract_opts):
+    """extract_from_pdf behind the cache; returns (results, was_cached)."""
+    from extract_blood_results import extract_from_pdf
+    from archive_pack import document_sha256
+
+    doc_hash = document_sha256(filepath)
+    results = cache.get(doc_hash)
+    if results is not None:
+        report.count("cache_hits")
+        return results, True
+    report.count("cache_misses")
+    # The report may be shared by several documents, so compare counts
+    before = [report.counters[name] for name in INCOMPLETE_COUNTERS]
+    results = extract_from_pdf(filepath, report, **extract_opts)
+    if [report.counters[name] for name in INCOMPLETE_COUNTERS] == before:
+        cache.put(doc_hash, results)
+    else:
+        # Unreadable, or scanned pages skipped without Tesseract: retry next run
+        report.count("cache_skipped")
+    return results, False
@@ -1,5 +1,11 @@
 import sys
 import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from archive_pack import document_exists, file_sha256, list_documents, open_document, packed_archive
+from atomic_io import write_json_atomic
 
 def inspect_pdf(path):
     print(f"Inspecting {path}...")
@@ -8,7 +14,7 @@ def inspect_pdf(path):
     try:
         import pdfplumber
         print("Using pdfplumber...")
-        with pdfplumber.open(path) as pdf:
+        with pdfplumber.open(open_document(path)) as pdf:
             print(f"Total pages: {len(pdf.pages)}")
             for i, page in enumerate(pdf.pages[:2]): 
                 print(f"--- Page {i+1} ---")
@@ -16,7 +22,7 @@ def inspect_pdf(path):
                 if text:
                     print(text[:1000])
                 else:
-                    print("[No text extracted]")
+                    print("[No text extracted - scanned page, extract_blood_results.py will OCR it]")
                 print("\n")
         return
     except ImportError:
@@ -28,7 +34,7 @@ def inspect_pdf(path):
     try:
         from pypdf import PdfReader
         print("Using pypdf...")
-        reader = PdfReader(path)
+        reader = PdfReader(open_document(path))
         print(f"Total pages: {len(reader.pages)}")
         for i, page in enumerate(reader.pages[:2]):
             print(f"--- Page {i+1} ---")
@@ -36,7 +42,7 @@ def inspect_pdf(path):
             if text:
                 print(text[:1000])
             else:
-                 print("[No text extracted]")
+                 print("[No text extracted - scanned page, extract_blood_results.py will OCR it]")
             print("\n")
         return
     except ImportError:
@@ -46,16 +52,128 @@ def inspect_pdf(path):
 
     print("Could not extract text. Install pdfplumber or pypdf.")
 
-if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        target_file = sys.argv[1]
+LAYOUT_MARKERS = [
+    ("synlab", ["synlab"]),
+    ("hospital", ["megnevezés", "kórház", "egyetem"]),
+]
+RESULT_MARKERS = ["eredmény", "referencia", "egység", "tartomány"]
+DEFAULT_INDEX = "archive_index.json"
+PROBE_PAGES = 2
+
+def detect_layout(text):
+    lower = text.lower()
+    for name, markers in LAYOUT_MARKERS:
+        if any(m in lower for m in markers):
+            return name
+    return "other"
+
+def probe_pdf(path):
+    """Cheap probe: page count and the text of the first pages only."""
+    record = {"pages": None, "has_text": False, "layout": None, "has_results": False, "error": None}
+    try:
+        try:
+            from pypdf import PdfReader
+            reader = PdfReader(open_document(path))
+            record["pages"] = len(reader.pages)
+            text = "\n".join((p.extract_text() or "") for p in reader.pages[:PROBE_PAGES])
+        except ImportError:
+            import pdfplumber
+            with pdfplumber.open(open_document(path)) as pdf:
+                record["pages"] = len(pdf.pages)
+                text = "\n".join((p.extract_text() or "") for p in pdf.pages[:PROBE_PAGES])
+    except Exception as e:
+        record["error"] = str(e)
+        return record
+
+    record["has_text"] = bool(text.strip())
+    if record["has_text"]:
+        lower = text.lower()
+        record["layout"] = detect_layout(lower)
+        record["has_results"] = sum(m in lower for m in RESULT_MARKERS) >= 2
+    return record
+
+def load_index(index_path):
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {"files": {}, "paths": {}}
+
+def _hash_if_changed(args):
+    path, cached = args
+    if not os.path.exists(path):
+        # Packed: the pack index already holds the content hash
+        pack = packed_archive(os.path.dirname(path))
+        name = os.path.basename(path)
+        return path, {"size": pack.size(name), "mtime": None, "sha256": pack.sha256(name)}
+    st = os.stat(path)
+    if cached and cached["size"] == st.st_size and cached["mtime"] == st.st_mtime:
+        return path, cached
+    return path, {"size": st.st_size, "mtime": st.st_mtime, "sha256": file_sha256(path)}
+
+def batch_inspect(archive_dir, index_path=DEFAULT_INDEX, workers=None, refresh=False):
+    """Probes every PDF in archive_dir, re-probing only content not yet indexed."""
+    index = load_index(index_path)
+    paths = sorted(
+        os.path.join(archive_dir, f) for f in list_documents(archive_dir)
+    )
+
+    # Unchanged size+mtime reuses the stored hash, so warm runs don't even
+    # read the files.
+    with ThreadPoolExecutor(max_workers=workers or 8) as pool:
+        stats = dict(pool.map(_hash_if_changed, [(p, index["paths"].get(p)) for p in paths]))
+
+    todo = sorted({s["sha256"]: p for p, s in stats.items()
+                   if refresh or s["sha256"] not in index["files"]}.items())
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for (sha, path), record in zip(todo, pool.map(probe_pdf, [p for _, p in todo])):
+                index["files"][sha] = record
+
+    index["paths"] = stats
+    write_json_atomic(index_path, index)
+    print(f"Indexed {len(paths)} files ({len(todo)} probed, {len(paths) - len(todo)} cached) -> {index_path}")
+    return [(p, index["files"][stats[p]["sha256"]]) for p in paths]
+
+def print_summary(rows):
+    print(f"{'File':<60} {'Pages':>5}  {'Text':<4}  {'Layout':<8}  {'Results':<7}")
+    for path, rec in rows:
+        name = os.path.basename(path)
+        name = name if len(name) <= 60 else name[:57] + "..."
+        if rec.get("error"):
+            print(f"{name:<60} {'?':>5}  error: {rec['error'][:40]}")
+            continue
+        print(f"{name:<60} {rec['pages']:>5}  {'yes' if rec['has_text'] else 'NO':<4}  "
+              f"{rec['layout'] or '-':<8}  {'yes' if rec['has_results'] else '-':<7}")
+    print(f"\n{len(rows)} files, {sum(r['pages'] or 0 for _, r in rows)} pages, "
+          f"{sum(1 for _, r in rows if not r['has_text'] and not r.get('error'))} without text layer, "
+          f"{sum(1 for _, r in rows if r['has_results'])} with result tables")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect one PDF, or triage a whole archive with --batch.")
+    parser.add_argument("file", nargs="?")
+    parser.add_argument("--batch", nargs="?", const="EESZT_Archive", metavar="DIR",
+                        help="Probe every PDF in DIR (default: EESZT_Archive) in parallel")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Persistent per-file index (batch mode)")
+    parser.add_argument("--workers", type=int, help="Worker processes for batch probing")
+    parser.add_argument("--refresh", action="store_true", help="Re-probe files already in the index")
+    args = parser.parse_args(argv)
+
+    if args.batch:
+        if not os.path.isdir(args.batch):
+            print(f"Archive directory not found: {args.batch}")
+            sys.exit(1)
+        print_summary(batch_inspect(args.batch, args.index, args.workers, args.refresh))
+        return
+
+    if args.file:
+        target_file = args.file
     else:
         target_file = "EESZT_Archive/2024-07-12- - 2024-07-12_Synlab Hungary Kft. (113030)_Általános laboratóriumi ellátá.pdf"
 
-    if not os.path.exists(target_file):
+    if not document_exists(target_file):
         print(f"File not found: {target_file}")
         # Try finding *any* PDF in EESZT_Archive
-        pdfs = [f for f in os.listdir("EESZT_Archive") if f.endswith(".pdf")] if os.path.exists("EESZT_Archive") else []
+        pdfs = list_documents("EESZT_Archive") if os.path.exists("EESZT_Archive") else []
         if pdfs:
             target_file = os.path.join("EESZT_Archive", pdfs[0])
             print(f"Using alternate file: {target_file}")
@@ -69,3 +187,6 @@ if __name__ == "__main__":
                 sys.exit(1) # Exit if no file can be found
     
     inspect_pdf(target_file)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import resource
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class RunReport:
+    """Wall time and counters per pipeline stage for one run."""
+
+    def __init__(self):
+        self.started = datetime.now().isoformat()
+        self.stages = {}
+        self.counters = Counter()
+        self.gauges = {}
+        self._t0 = time.perf_counter()
+
+    def add_time(self, name, seconds, calls=1):
+        stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+        stage["seconds"] += seconds
+        stage["calls"] += calls
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def max_gauge(self, name, value):
+        """Keeps the largest value seen, e.g. peak RSS across workers."""
+        if value is not None and value > self.gauges.get(name, float("-inf")):
+            self.gauges[name] = value
+
+    def merge(self, other):
+        """Folds a report from another process (as dict) into this one.
+
+        Its gauges describe that process, so they are kept under worker_
+        names and never overwrite this process's own (e.g. peak_rss_mb).
+        """
+        for name, stage in other.get("stages", {}).items():
+            self.add_time(name, stage["seconds"], stage["calls"])
+        self.counters.update(other.get("counters", {}))
+        for name, value in other.get("gauges", {}).items():
+            self.max_gauge(name if name.startswith("worker_") else "worker_" + name, value)
+
+    def to_dict(self):
+        self.max_gauge("peak_rss_mb", round(peak_rss_mb(), 1))
+        return {
+            "started": self.started,
+            "wall_seconds": round(time.perf_counter() - self._t0, 4),
+            "stages": {
+                name: {"seconds": round(s["seconds"], 4), "calls": s["calls"]}
+                for name, s in sorted(self.stages.items(), key=lambda kv: -kv[1]["seconds"])
+            },
+            "counters": dict(sorted(self.counters.items())),
+            "gauges": dict(sorted(self.gauges.items())),
+            "hit_rates": self.hit_rates(),
+        }
+
+    def hit_rates(self):
+        """hits / (hits + misses) for every <name>_hits/<name>_misses counter pair."""
+        rates = {}
+        for name, hits in self.counters.items():
+            if name.endswith("_hits"):
+                prefix = name[:-len("_hits")]
+                total = hits + self.counters.get(prefix + "_misses", 0)
+                rates[prefix] = round(hits / total, 4) if total else None
+        return dict(sorted(rates.items()))
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=4, ensure_ascii=False)
+        logging.info(f"Run report written to {path}")
+
+
+def peak_rss_mb():
+    # VmHWM restarts at exec; ru_maxrss is inherited across fork+exec, so a
+    # spawned worker would report at least its parent's peak.
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux but bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # No procfs (macOS): the peak is the closest cheap upper bound
+        return peak_rss_mb()
+
+
+_current = RunReport()
+
+
+def get_report():
+    return _current
+
+
+def new_report():
+    global _current
+    _current = RunReport()
+    return _current
+
+
+def run_profiled(func, profiler=None, output=None):
+    """Runs func() under cProfile or pyinstrument when requested."""
+    if not profiler:
+        return func()
+
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logging.error("pyinstrument not installed. Please install it using: pip install pyinstrument")
+            return func()
+        prof = Profiler()
+        prof.start()
+        try:
+            return func()
+        finally:
+            prof.stop()
+            output = output or "profile.html"
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write(prof.output_html())
+            logging.info(f"pyinstrument profile written to {output}")
+
+    import cProfile
+    import pstats
+    prof = cProfile.Profile()
+    try:
+        return prof.runcall(func)
+    finally:
+        output = output or "profile.pstats"
+        prof.dump_stats(output)
+        pstats.Stats(prof).sort_stats("cumulative").print_stats(20)
+        logging.info(f"cProfile stats written to {output}")
@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import http.client
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from extract_service import DEFAULT_HOST, DEFAULT_PORT, percentile
+
+# Load test for extract_service.py: POSTs the PDFs of a directory (or a
+# generated synthetic corpus) with N concurrent clients and reports
+# latency percentiles and throughput.
+#
+#   python extract_service.py --workers 4 &
+#   python load_test_service.py --requests 200 --concurrency 8
+#   python load_test_service.py --no-cache      # every request is parsed
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=60):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def _connect(args):
+    if args.socket:
+        return UnixHTTPConnection(args.socket, timeout=args.timeout)
+    return http.client.HTTPConnection(args.host, args.port, timeout=args.timeout)
+
+
+def load_pdfs(pdf_dir, generate):
+    if pdf_dir:
+        paths = sorted(os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf"))
+    else:
+        import tempfile
+        from benchmark_extractor import generate_corpus
+        pdf_dir = tempfile.mkdtemp(prefix="eeszt_load_")
+        generate_corpus(pdf_dir, generate, seed=1)
+        paths = sorted(os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir) if f.endswith(".pdf"))
+    docs = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            docs.append((os.path.basename(path), f.read()))
+    return docs
+
+
+def run_load(args, docs):
+    local = threading.local()
+    path = "/extract?cache=0" if args.no_cache else "/extract"
+
+    def one_request(i):
+        name, body = docs[i % len(docs)]
+        if not hasattr(local, "conn"):
+            local.conn = _connect(args)
+        start = time.perf_counter()
+        try:
+            local.conn.request("POST", path, body=body, headers={"Content-Type": "application/pdf"})
+            response = local.conn.getresponse()
+            payload = response.read()
+            status, cache = response.status, response.getheader("X-Cache")
+            server_ms = response.getheader("X-Extract-Ms")
+        except (OSError, http.client.HTTPException) as e:
+            local.conn.close()
+            del local.conn
+            return {"name": name, "status": None, "error": str(e), "ms": (time.perf_counter() - start) * 1000}
+        ms = (time.perf_counter() - start) * 1000
+        results = len(json.loads(payload)) if status == 200 else 0
+        return {"name": name, "status": status, "ms": ms, "cache": cache,
+                "server_ms": float(server_ms) if server_ms else None, "results": results}
+
+    # Warm-up round so every document is seen once (and cached, unless --no-cache)
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one_request, range(min(len(docs), args.requests))))
+        start = time.perf_counter()
+        samples = list(pool.map(one_request, range(args.requests)))
+        wall = time.perf_counter() - start
+    return samples, wall
+
+
+def summarize(samples, wall):
+    ok = [s for s in samples if s["status"] == 200]
+    latencies = [s["ms"] for s in ok]
+    server = [s["server_ms"] for s in ok if s.get("server_ms") is not None]
+
+    def pct(values):
+        return {f"p{q}": round(percentile(values, q), 2) if values else None for q in (50, 90, 99)}
+
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": dict(Counter(str(s["status"]) for s in samples if s["status"] != 200)),
+        "cache_hits": sum(1 for s in ok if s.get("cache") == "hit"),
+        "wall_seconds": round(wall, 3),
+        "requests_per_sec": round(len(samples) / wall, 2) if wall else None,
+        "latency_ms": {**pct(latencies), "max": round(max(latencies), 2) if latencies else None},
+        "server_extract_ms": pct(server),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test extract_service.py and report p50/p99 latency.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="Unix socket of the service")
+    parser.add_argument("--pdf-dir", help="PDFs to upload (default: a generated synthetic corpus)")
+    parser.add_argument("--generate", type=int, default=20, help="Synthetic documents when no --pdf-dir")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the service's result cache")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Also write the summary JSON here")
+    args = parser.parse_args(argv)
+
+    docs = load_pdfs(args.pdf_dir, args.generate)
+    if not docs:
+        logging.error("No PDFs to send.")
+        sys.exit(1)
+    samples, wall = run_load(args, docs)
+    summary = summarize(samples, wall)
+    print(json.dumps(summary, indent=4))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=4)
+    if summary["ok"] < summary["requests"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
+    main()
@@ -0,0 +1,154 @@
+import os
+import re
+import json
+import logging
+from bisect import bisect_left, bisect_right
+
+from atomic_io import write_json_atomic
+
+# manifest.json as written by downloader.py: one record per downloaded
+# document. Next to the raw portal text (date, institution, type, doctor)
+# every record carries typed fields parsed once at write time:
+#
+#   "date": "2023.03.31. - 2023.04.03."  ->  date_start "2023-03-31", date_end "2023-04-03"
+#   "institution": "Synlab Hungary Kft. (113030)"
+#                                        ->  institution_name, institution_code "113030"
+#   "type": "Záró dokumentum (99) / 2418..."
+#                                        ->  type_name "Záró dokumentum", type_code 99, document_id "2418..."
+#
+# Older manifests are normalized on load (or once with `python manifest.py`).
+# Kept free of PDF/numpy imports so quick commands can read it cheaply.
+
+MANIFEST_FILE = "manifest.json"
+# "Általános laboratóriumi ellátás lelete (12)" and its structured variant (42)
+LAB_TYPE_CODES = (12, 42)
+
+_DATE = re.compile(r'(\d{4})\.\s*(\d{2})\.\s*(\d{2})\.?')
+_CODED = re.compile(r'^(.*?)\s*\(([^()]+)\)\s*$')
+_TYPE = re.compile(r'^(.*?)\s*\((\d+)\)\s*(?:/\s*(\S+))?\s*$')
+
+
+def parse_date_range(text):
+    """("2018.03.27. - 2018.04.02.") -> ("2018-03-27", "2018-04-02"); missing parts are None."""
+    dates = ["-".join(m) for m in _DATE.findall(text or "")]
+    if not dates:
+        return None, None
+    return dates[0], dates[-1]
+
+
+def parse_coded(text):
+    """"Semmelweis Egyetem (164482)" -> ("Semmelweis Egyetem", "164482")."""
+    match = _CODED.match(text or "")
+    if not match:
+        return (text or None), None
+    return match.group(1), match.group(2)
+
+
+def parse_type(text):
+    """"Záró dokumentum (99) / 2418..." -> ("Záró dokumentum", 99, "2418...")."""
+    match = _TYPE.match(text or "")
+    if not match:
+        return (text or None), None, None
+    return match.group(1), int(match.group(2)), match.group(3)
+
+
+def normalize_entry(entry):
+    """Entry with the typed fields filled in from the raw ones (a new dict)."""
+    entry = dict(entry)
+    entry["date_start"], entry["date_end"] = parse_date_range(entry.get("date"))
+    entry["type_name"], entry["type_code"], entry["document_id"] = parse_type(entry.get("type"))
+    entry["institution_name"], entry["institution_code"] = parse_coded(entry.get("institution"))
+    return entry
+
+
+def load_manifest(manifest_path=MANIFEST_FILE):
+    if not os.path.exists(manifest_path):
+        logging.error(f"Manifest not found at {manifest_path}")
+        return []
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    return [e if "type_code" in e else normalize_entry(e) for e in entries]
+
+
+def migrate_manifest(manifest_path=MANIFEST_FILE):
+    """Rewrites manifest.json with typed fields; raw fields are kept."""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    migrated = [normalize_entry(e) for e in entries]
+    write_json_atomic(manifest_path, migrated)
+    logging.info(f"Migrated {len(migrated)} entries in {manifest_path}")
+    return migrated
+
+
+class ManifestIndex:
+    """Sorted date and type-code indexes over manifest entries.
+
+    Date bounds are inclusive ISO prefixes: "2023", "2023-03" or
+    "2023-03-31". Entries without a parseable date are left out of date
+    queries and come last in chronological().
+    """
+
+    def __init__(self, entries):
+        self.entries = [e if "type_code" in e else normalize_entry(e) for e in entries]
+        dated = sorted((e["date_start"], i) for i, e in enumerate(self.entries) if e["date_start"])
+        self._dates = [d for d, _ in dated]
+        self._by_date = [i for _, i in dated]
+        self._undated = [i for i, e in enumerate(self.entries) if not e["date_start"]]
+        # Per type code, positions in chronological order
+        self._rank = {}
+        self._by_type = {}
+        for rank, i in enumerate(self._by_date + self._undated):
+            self._rank[i] = rank
+            self._by_type.setdefault(self.entries[i]["type_code"], []).append(i)
+
+    def _date_positions(self, start=None, end=None):
+        lo = bisect_left(self._dates, start) if start else 0
+        # "~" sorts after digits and "-", so a prefix bound covers its whole year/month
+        hi = bisect_right(self._dates, end + "~") if end else len(self._dates)
+        return self._by_date[lo:hi]
+
+    def between(self, start=None, end=None):
+        """Entries dated within [start, end], oldest first."""
+        return [self.entries[i] for i in self._date_positions(start, end)]
+
+    def chronological(self):
+        return [self.entries[i] for i in self._by_date + self._undated]
+
+    def by_type(self, codes, start=None, end=None):
+        """Entries with one of the type codes, oldest first, optionally within a date range."""
+        positions = [i for code in codes for i in self._by_type.get(code, [])]
+        if len(codes) > 1:
+            positions.sort(key=self._rank.__getitem__)
+        if start or end:
+            in_range = set(self._date_positions(start, end))
+            positions = [i for i in positions if i in in_range]
+        return [self.entries[i] for i in positions]
+
+    def untyped(self):
+        return [self.entries[i] for i in self._by_type.get(None, [])]
+
+
+def _looks_like_lab(d):
+    # Old heuristic, only for entries whose type carries no code
+    return ("labor" in (d.get('type') or '').lower()
+            or "labor" in (d.get('filepath') or '').lower()
+            or "Synlab" in (d.get('institution') or ''))
+
+
+def select_lab_documents(manifest, start=None, end=None):
+    """Laboratory reports (type 12/42) oldest first, optionally limited to a date range."""
+    index = manifest if isinstance(manifest, ManifestIndex) else ManifestIndex(manifest)
+    docs = index.by_type(LAB_TYPE_CODES, start, end)
+    untyped = [d for d in index.untyped() if _looks_like_lab(d)]
+    if untyped:
+        if start or end:
+            untyped = [d for d in untyped if d["date_start"] and (not start or d["date_start"] >= start)
+                       and (not end or d["date_start"] <= end + "~")]
+        docs += untyped
+    return docs
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    migrate_manifest(sys.argv[1] if len(sys.argv) > 1 else MANIFEST_FILE)
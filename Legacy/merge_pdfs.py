@@ -1,48 +1,72 @@
 import os
-from pypdf import PdfWriter
 import logging
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from archive_pack import list_documents, open_document
+from manifest import MANIFEST_FILE, ManifestIndex, load_manifest
 
+# Produces a single human-readable PDF of the archive. extract_blood_results.py
+# reads the archive documents directly and only uses this file with --source merged.
 ARCHIVE_DIR = "./EESZT_Archive"
 OUTPUT_FILE = "merged_medical_history.pdf"
 
-def merge_pdfs():
-    if not os.path.exists(ARCHIVE_DIR):
-        logging.error(f"Archive directory not found: {ARCHIVE_DIR}")
+def chronological_order(files, manifest_path):
+    """Orders file names by the manifest's date index; unlisted files follow by name."""
+    files = sorted(files)
+    if not os.path.exists(manifest_path):
+        # Our downloader names them YYYY-MM-DD_Institution_Type.pdf
+        return files
+    present = set(files)
+    ordered = []
+    for entry in ManifestIndex(load_manifest(manifest_path)).chronological():
+        name = os.path.basename(entry.get("filepath") or "")
+        if name in present:
+            ordered.append(name)
+            present.discard(name)
+    return ordered + [f for f in files if f in present]
+
+def merge_pdfs(archive_dir=ARCHIVE_DIR, output_file=OUTPUT_FILE, manifest_path=None):
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        logging.error("pypdf not installed. Please install it using: pip install pypdf")
+        return
+
+    if not os.path.exists(archive_dir):
+        logging.error(f"Archive directory not found: {archive_dir}")
         return
 
-    # Get all PDF files
-    files = [f for f in os.listdir(ARCHIVE_DIR) if f.lower().endswith('.pdf')]
+    # Get all PDF files (loose or packed)
+    files = list_documents(archive_dir)
     
     if not files:
         logging.warning("No PDF files found to merge.")
         return
 
-    # Sort files to ensure chronological order if filenames start with YYYY-MM-DD
-    # Our downloader names them: YYYY-MM-DD_Institution_Type.pdf
-    files.sort()
+    # Chronological via the manifest's date index (manifest.json next to the archive)
+    if manifest_path is None:
+        manifest_path = os.path.join(os.path.dirname(os.path.normpath(archive_dir)), MANIFEST_FILE)
+    files = chronological_order(files, manifest_path)
     
     logging.info(f"Found {len(files)} PDF files to merge.")
     
     merger = PdfWriter()
 
     for filename in files:
-        filepath = os.path.join(ARCHIVE_DIR, filename)
+        filepath = os.path.join(archive_dir, filename)
         try:
             logging.info(f"Adding: {filename}")
-            merger.append(filepath)
+            merger.append(open_document(filepath))
         except Exception as e:
             logging.error(f"Failed to add {filename}: {e}")
 
     try:
-        logging.info(f"Writing merged PDF to {OUTPUT_FILE}...")
-        merger.write(OUTPUT_FILE)
+        logging.info(f"Writing merged PDF to {output_file}...")
+        merger.write(output_file)
         merger.close()
         logging.info("Merge completed successfully!")
     except Exception as e:
         logging.error(f"Failed to write merged PDF: {e}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     merge_pdfs()
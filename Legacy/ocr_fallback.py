@@ -0,0 +1,262 @@
+import os
+import io
+import re
+import json
+import hashlib
+import logging
+from statistics import median
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+
+from atomic_io import write_json_atomic
+
+# OCR fallback for scanned archive documents. Pages whose content streams
+# draw no text at all are rasterized and run through local Tesseract
+# (pytesseract) on a process pool; the word boxes are grouped into table
+# rows and go through the same parse_table() as text-layer pages. OCR
+# output is cached on disk by a hash of the page's content and images, so
+# a page is OCR'd once no matter which file or pack it comes from.
+
+DEFAULT_OCR_CACHE_DIR = ".ocr_cache"
+DEFAULT_OCR_LANG = "hun"
+OCR_DPI = 300
+# A gap wider than this many word heights starts a new cell
+CELL_GAP_FACTOR = 1.2
+
+# Text-showing operators (Tj, TJ, ', "). A bare BT/ET pair shows nothing;
+# some producers write one into every page, scanned or not.
+_SHOW_OPERATORS = re.compile(rb'\bT[jJ]\b|[\'"]')
+# Inline image data is binary and may contain anything
+_INLINE_IMAGE = re.compile(rb'\bBI\b.*?\bID\s.*?\bEI\b', re.DOTALL)
+_unavailable_logged = False
+
+
+def _stream_data(obj, decode=True):
+    """Bytes of a stream without leaving a decoded copy behind.
+
+    pdfminer keeps a decoded stream on the (cached) object until the PDF is
+    closed, which for scans is every full-size bitmap. Images are hashed
+    as stored (decode=False); content streams are decoded for the
+    operator scan and then put back into their encoded state.
+    """
+    from pdfminer.pdftypes import resolve1
+
+    obj = resolve1(obj)
+    raw = getattr(obj, "rawdata", None)
+    if raw is None:
+        # Already decoded elsewhere (or not a stream)
+        return getattr(obj, "data", None) or b""
+    if not decode:
+        return raw
+    try:
+        data = obj.get_data()
+    except Exception:
+        return b""
+    obj.data, obj.rawdata = None, raw
+    return data
+
+
+def _shows_text(data):
+    return bool(_SHOW_OPERATORS.search(_INLINE_IMAGE.sub(b"", data)))
+
+
+def _walk_xobjects(resources, h, seen):
+    """Hashes every XObject reachable from resources (images inside forms
+    included); True if any form XObject shows text."""
+    from pdfminer.pdftypes import resolve1
+
+    has_text = False
+    xobjects = resolve1((resolve1(resources) or {}).get("XObject")) or {}
+    for name in sorted(xobjects):
+        ref = xobjects[name]
+        xobj = resolve1(ref)
+        key = getattr(ref, "objid", None) or id(xobj)
+        h.update(str(name).encode())
+        if key in seen:
+            continue
+        seen.add(key)
+        subtype = getattr(xobj, "attrs", {}).get("Subtype")
+        is_form = getattr(subtype, "name", None) == "Form"
+        data = _stream_data(xobj, decode=is_form)
+        h.update(data)
+        if is_form:
+            has_text = _shows_text(data) or has_text
+            has_text = _walk_xobjects(xobj.attrs.get("Resources"), h, seen) or has_text
+    return has_text
+
+
+def page_fingerprint(page):
+    """(has_text, content hash) from the raw page objects, without layout analysis.
+
+    has_text means some content stream (or form XObject) shows text; the
+    hash covers the page streams and every image they draw, however nested.
+    """
+    page_obj = page.page_obj
+    h = hashlib.sha256(repr((page.width, page.height)).encode())
+    has_text = False
+    for stream in page_obj.contents:
+        data = _stream_data(stream)
+        has_text = has_text or _shows_text(data)
+        h.update(data)
+    has_text = _walk_xobjects(page_obj.resources, h, set()) or has_text
+    return has_text, h.hexdigest()
+
+
+class OcrCache:
+    """OCR word boxes on disk, keyed by page content hash (plus language and DPI)."""
+
+    def __init__(self, cache_dir=DEFAULT_OCR_CACHE_DIR, lang=DEFAULT_OCR_LANG, dpi=OCR_DPI):
+        self.root = os.path.join(cache_dir, f"{lang}-{dpi}")
+
+    def _path(self, page_hash):
+        return os.path.join(self.root, page_hash[:2], page_hash + ".json")
+
+    def get(self, page_hash):
+        path = self._path(page_hash)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable OCR cache entry {path}: {e}")
+            return None
+
+    def put(self, page_hash, words):
+        write_json_atomic(self._path(page_hash), words, indent=None)
+
+
+def tesseract_available():
+    global _unavailable_logged
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception as e:
+        if not _unavailable_logged:
+            logging.error(f"OCR fallback disabled ({e}). Install Tesseract and: pip install pytesseract")
+            _unavailable_logged = True
+        return False
+
+
+def _ocr_image(png, lang):
+    """Worker: word boxes of one rasterized page."""
+    import pytesseract
+    from PIL import Image
+
+    data = pytesseract.image_to_data(Image.open(io.BytesIO(png)), lang=lang,
+                                     output_type=pytesseract.Output.DICT)
+    words = []
+    for i, text in enumerate(data["text"]):
+        text = text.strip()
+        if not text or float(data["conf"][i]) < 0:
+            continue
+        words.append({
+            "text": text,
+            "left": data["left"][i], "top": data["top"][i],
+            "width": data["width"][i], "height": data["height"][i],
+            "line": [data["block_num"][i], data["par_num"][i], data["line_num"][i]],
+        })
+    return words
+
+
+def words_to_rows(words):
+    """Groups OCR words into table rows: words whose vertical centres fall
+    within one line's height form a row, cells split at wide gaps.
+
+    Tesseract's own line numbers can't be used: on column layouts it puts
+    each column in its own block, which would make every cell a row.
+    """
+    if not words:
+        return []
+    gap = CELL_GAP_FACTOR * median(w["height"] for w in words)
+
+    lines = []  # [top, bottom, words] of the line's first word
+    for w in sorted(words, key=lambda w: w["top"] + w["height"] / 2):
+        centre = w["top"] + w["height"] / 2
+        if lines and centre <= lines[-1][1]:
+            lines[-1][2].append(w)
+        else:
+            lines.append([w["top"], w["top"] + w["height"], [w]])
+
+    rows = []
+    for _, _, line in lines:
+        line.sort(key=lambda w: w["left"])
+        cells = [[line[0]["text"]]]
+        for prev, w in zip(line, line[1:]):
+            if w["left"] - (prev["left"] + prev["width"]) > gap:
+                cells.append([])
+            cells[-1].append(w["text"])
+        rows.append([" ".join(c) for c in cells])
+    return rows
+
+
+def _render(page):
+    buffer = io.BytesIO()
+    page.to_image(resolution=OCR_DPI).original.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def ocr_textless_pages(pdf, report, workers=None, cache_dir=DEFAULT_OCR_CACHE_DIR, lang=DEFAULT_OCR_LANG,
+                       tesseract=None):
+    """{page index: table rows} for the pages of pdf that have no text layer.
+
+    Cached pages cost one hash; the rest are rasterized here and OCR'd on a
+    process pool (inline with workers=1, e.g. inside another worker). Only
+    one batch of rendered pages (one per worker) is held at a time, so
+    memory doesn't grow with the length of a scanned document. tesseract
+    (True/False) skips the availability check when the caller already did it.
+    """
+    todo = {}
+    pages = {}
+    with report.stage("ocr_detect"):
+        for page in pdf.pages:
+            has_text, page_hash = page_fingerprint(page)
+            if not has_text:
+                todo[page.page_number - 1] = page_hash
+                pages[page.page_number - 1] = page
+    if not todo:
+        return {}
+    report.count("ocr_pages", len(todo))
+
+    # Repeated pages (the same scan appended twice) are OCR'd once
+    first = {}
+    for idx, page_hash in todo.items():
+        first.setdefault(page_hash, idx)
+
+    cache = OcrCache(cache_dir, lang)
+    words = {}
+    misses = []
+    for page_hash, idx in first.items():
+        cached = cache.get(page_hash)
+        if cached is not None:
+            words[page_hash] = cached
+            report.count("ocr_cache_hits")
+        else:
+            misses.append(idx)
+            report.count("ocr_cache_misses")
+
+    if misses and not (tesseract if tesseract is not None else tesseract_available()):
+        report.count("ocr_unavailable", len(misses))
+        misses = []
+    workers = min(workers or os.cpu_count() or 1, max(1, len(misses)))
+    with ExitStack() as stack:
+        pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers)) if workers > 1 else None
+        for start in range(0, len(misses), workers):
+            batch = misses[start:start + workers]
+            with report.stage("ocr_rasterize"):
+                images = []
+                for idx in batch:
+                    images.append(_render(pages[idx]))
+                    pages[idx].close()
+            with report.stage("ocr"):
+                if pool:
+                    results = list(pool.map(_ocr_image, images, [lang] * len(images)))
+                else:
+                    results = [_ocr_image(png, lang) for png in images]
+            del images
+            for idx, page_words in zip(batch, results):
+                cache.put(todo[idx], page_words)
+                words[todo[idx]] = page_words
+
+    return {idx: words_to_rows(words[h]) for idx, h in todo.items() if h in words}
@@ -0,0 +1,230 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import argparse
+from datetime import date, timedelta
+
+from analyze_results import parse_value, document_date
+from archive_pack import document_exists, document_sha256
+
+DEFAULT_DB = "blood_results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_hash     TEXT PRIMARY KEY,
+    filepath     TEXT,
+    date         TEXT,
+    institution  TEXT,
+    type         TEXT,
+    doctor       TEXT,
+    metadata     TEXT NOT NULL,
+    extracted_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE TABLE IF NOT EXISTS results (
+    id        INTEGER PRIMARY KEY,
+    doc_hash  TEXT NOT NULL REFERENCES documents(doc_hash) ON DELETE CASCADE,
+    test_name TEXT NOT NULL,
+    date      TEXT,
+    result    TEXT,
+    value     REAL,
+    unit      TEXT,
+    ref_range TEXT,
+    ref_min   REAL,
+    ref_max   REAL,
+    flag      TEXT,
+    status    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_results_test_date ON results(test_name, date);
+CREATE INDEX IF NOT EXISTS idx_results_status_date ON results(status, date);
+CREATE INDEX IF NOT EXISTS idx_results_doc ON results(doc_hash);
+CREATE INDEX IF NOT EXISTS idx_documents_institution ON documents(institution);
+CREATE INDEX IF NOT EXISTS idx_documents_date ON documents(date);
+CREATE INDEX IF NOT EXISTS idx_documents_filepath ON documents(filepath);
+"""
+
+OUT_OF_RANGE = ("low", "high")
+
+
+def document_hash(metadata, root="."):
+    """Content hash of the source PDF, or of the metadata if the file is gone.
+
+    Manifest paths ("./EESZT_Archive/...") are relative to the archive
+    root, which need not be the current directory (batch, watch mode).
+    """
+    filepath = metadata.get("filepath")
+    if filepath and not os.path.isabs(filepath):
+        filepath = os.path.join(root, filepath)
+    if filepath and document_exists(filepath):
+        return document_sha256(filepath)
+    payload = json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def connect(db_path=DEFAULT_DB):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _status(entry):
+    # Analytics (analyze_results) normally fills this in; fall back to the
+    # ref range so older JSON exports still index out-of-range rows.
+    if entry.get("status"):
+        return entry["status"]
+    value = parse_value(entry.get("result"))
+    if value is None:
+        return "unknown"
+    ref_min, ref_max = entry.get("ref_min"), entry.get("ref_max")
+    if ref_min is None and ref_max is None:
+        return "unknown"
+    if ref_min is not None and value < ref_min:
+        return "low"
+    if ref_max is not None and value > ref_max:
+        return "high"
+    return "normal"
+
+
+def upsert_document(conn, doc_record, doc_hash=None, root="."):
+    """Replaces a document and its results, keyed by document hash."""
+    metadata = doc_record.get("metadata", {})
+    doc_hash = doc_hash or document_hash(metadata, root)
+    doc_date = document_date(metadata)
+
+    conn.execute("DELETE FROM results WHERE doc_hash = ?", (doc_hash,))
+    if metadata.get("filepath"):
+        # A re-downloaded (corrected) PDF replaces the old version at its path
+        conn.execute("DELETE FROM documents WHERE filepath = ? AND doc_hash != ?",
+                     (metadata["filepath"], doc_hash))
+    conn.execute(
+        """INSERT INTO documents (doc_hash, filepath, date, institution, type, doctor, metadata)
+           VALUES (?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(doc_hash) DO UPDATE SET
+               filepath = excluded.filepath, date = excluded.date,
+               institution = excluded.institution, type = excluded.type,
+               doctor = excluded.doctor, metadata = excluded.metadata,
+               extracted_at = datetime('now')""",
+        (doc_hash, metadata.get("filepath"), doc_date, metadata.get("institution"),
+         metadata.get("type"), metadata.get("doctor"),
+         json.dumps(metadata, ensure_ascii=False)),
+    )
+    conn.executemany(
+        """INSERT INTO results (doc_hash, test_name, date, result, value, unit,
+                                ref_range, ref_min, ref_max, flag, status)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        [
+            (doc_hash, e.get("test_name"), doc_date, e.get("result"), parse_value(e.get("result")),
+             e.get("unit"), e.get("ref_range"), e.get("ref_min"), e.get("ref_max"),
+             e.get("flag"), _status(e))
+            for e in doc_record.get("results", [])
+        ],
+    )
+    return doc_hash
+
+
+def remove_documents(filepaths, db_path=DEFAULT_DB):
+    """Drops documents (and their results) whose source file went away."""
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.executemany("DELETE FROM documents WHERE filepath = ?", [(p,) for p in filepaths])
+    finally:
+        conn.close()
+
+
+def write_results(all_data, db_path=DEFAULT_DB, root="."):
+    """Extraction output backend: upserts every document record into SQLite.
+
+    root is the archive root the records' filepaths are relative to.
+    """
+    conn = connect(db_path)
+    try:
+        with conn:
+            for doc_record in all_data:
+                upsert_document(conn, doc_record, root=root)
+    finally:
+        conn.close()
+    logging.info(f"Stored {len(all_data)} documents in {db_path}")
+
+
+def query_results(conn, test_name=None, since=None, until=None, institution=None,
+                  out_of_range=False, limit=None):
+    sql = ["SELECT r.test_name, r.date, r.result, r.unit, r.ref_range, r.flag, r.status,",
+           "d.institution, d.filepath FROM results r JOIN documents d USING (doc_hash) WHERE 1=1"]
+    params = []
+    if test_name:
+        sql.append("AND r.test_name = ?")
+        params.append(test_name)
+    if since:
+        sql.append("AND r.date >= ?")
+        params.append(since)
+    if until:
+        sql.append("AND r.date <= ?")
+        params.append(until)
+    if institution:
+        sql.append("AND d.institution = ?")
+        params.append(institution)
+    if out_of_range:
+        sql.append("AND r.status IN (?, ?)")
+        params.extend(OUT_OF_RANGE)
+    sql.append("ORDER BY r.date, r.test_name")
+    if limit:
+        sql.append("LIMIT ?")
+        params.append(limit)
+    return [dict(row) for row in conn.execute(" ".join(sql), params)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite store for extracted blood results.")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="Upsert an extractor JSON export")
+    p_import.add_argument("json_file", nargs="?", default="blood_results.json")
+
+    p_query = sub.add_parser("query", help="Query stored results")
+    p_query.add_argument("--test", help="Exact test name, e.g. TSH")
+    p_query.add_argument("--since", help="YYYY-MM-DD")
+    p_query.add_argument("--until", help="YYYY-MM-DD")
+    p_query.add_argument("--last-days", type=int, help="Shortcut for --since today-N")
+    p_query.add_argument("--institution")
+    p_query.add_argument("--flagged", action="store_true", help="Only low/high results")
+    p_query.add_argument("--limit", type=int)
+    p_query.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        with open(args.json_file, 'r', encoding='utf-8') as f:
+            # blood_results.json sits in its archive root
+            write_results(json.load(f), args.db, os.path.dirname(args.json_file) or ".")
+        return
+
+    since = args.since
+    if args.last_days is not None:
+        since = (date.today() - timedelta(days=args.last_days)).isoformat()
+
+    conn = connect(args.db)
+    try:
+        rows = query_results(conn, test_name=args.test, since=since, until=args.until,
+                             institution=args.institution, out_of_range=args.flagged,
+                             limit=args.limit)
+    finally:
+        conn.close()
+
+    if args.json:
+        print(json.dumps(rows, indent=4, ensure_ascii=False))
+        return
+    for row in rows:
+        print(f"{row['date'] or '????-??-??'}  {row['test_name']:<30} {row['result'] or '':>10} {row['unit'] or '':<10} "
+              f"{row['status']:<8} {row['institution'] or ''}")
+    print(f"{len(rows)} results")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    main()
@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import select
+import logging
+import argparse
+
+from archive_pack import INDEX_NAME, document_exists, document_sha256
+from extraction_cache import DEFAULT_CACHE_DIR, ExtractionCache, extract_cached
+from instrumentation import RunReport
+
+# Long-running watch mode: re-extracts only the documents that appeared or
+# changed in EESZT_Archive (or whose manifest entry changed) and patches the
+# outputs in place. Uses inotify where available, so an idle watcher sits in
+# a blocking select() instead of rescanning.
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+
+
+class InotifyWatcher:
+    """Wakes up on any change below the given directories (Linux only)."""
+
+    def __init__(self, directories):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        for directory in directories:
+            if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout=None):
+        """True if something changed before the timeout (None blocks)."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        # The events themselves are not needed: the archive is re-scanned
+        # by size/mtime after the debounce, which also covers lost events.
+        os.read(self.fd, 64 * 1024)
+        return True
+
+    def drain(self):
+        while self.wait(0):
+            pass
+
+
+class PollingWatcher:
+    """Fallback for platforms without inotify: compares size/mtime listings."""
+
+    def __init__(self, directory, files=(), interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.files = files
+        self.interval = interval
+        self.last = self._snapshot()
+
+    def _snapshot(self):
+        snap = {}
+        try:
+            for entry in os.scandir(self.directory):
+                st = entry.stat()
+                snap[entry.path] = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        for path in self.files:
+            if os.path.exists(path):
+                snap[path] = _signature(path)
+        return snap
+
+    def drain(self):
+        self.last = self._snapshot()
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            pause = self.interval if deadline is None else min(self.interval, max(0.0, deadline - time.monotonic()))
+            time.sleep(pause)
+            snap = self._snapshot()
+            if snap != self.last:
+                self.last = snap
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+
+def make_watcher(archive_dir, manifest_path, poll_interval=DEFAULT_POLL_INTERVAL, force_polling=False):
+    if not force_polling and sys.platform.startswith("linux"):
+        try:
+            # The manifest's directory is watched as a whole: the downloader
+            # rewrites manifest.json rather than appending to it.
+            return InotifyWatcher([archive_dir, os.path.dirname(os.path.abspath(manifest_path))])
+        except OSError as e:
+            logging.warning(f"inotify unavailable ({e}), falling back to polling")
+    return PollingWatcher(archive_dir, [manifest_path], poll_interval)
+
+
+def _signature(path):
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+
+def _document_signature(path):
+    """Size/mtime of a loose file, or the content hash of a packed one."""
+    if os.path.exists(path):
+        return _signature(path)
+    return ("packed", document_sha256(path))
+
+
+def _document_mtime_ns(path):
+    # Packed documents are as old as the pack index that lists them
+    if os.path.exists(path):
+        return os.stat(path).st_mtime_ns
+    return os.stat(os.path.join(os.path.dirname(path), INDEX_NAME)).st_mtime_ns
+
+
+class ArchiveWatch:
+    """Incremental extraction state for one archive root."""
+
+    def __init__(self, root=".", db=None, cache_dir=DEFAULT_CACHE_DIR):
+        self.root = root
+        self.db = db
+        self.cache = ExtractionCache(cache_dir)
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.output_path = os.path.join(root, "blood_results.json")
+        self.records = {}
+        self.signatures = {}
+        self._load_outputs()
+
+    def _resolve(self, filepath):
+        return filepath if os.path.isabs(filepath) else os.path.join(self.root, filepath)
+
+    def _load_outputs(self):
+        # Documents already in blood_results.json and not touched since it
+        # was written count as up to date, so a restart doesn't re-extract.
+        if not os.path.exists(self.output_path):
+            return
+        with open(self.output_path, 'r', encoding='utf-8') as f:
+            all_data = json.load(f)
+        written_ns = os.stat(self.output_path).st_mtime_ns
+        for record in all_data:
+            filepath = record.get("metadata", {}).get("filepath")
+            if not filepath:
+                continue
+            self.records[filepath] = record
+            path = self._resolve(filepath)
+            if document_exists(path) and _document_mtime_ns(path) <= written_ns:
+                self.signatures[filepath] = _document_signature(path)
+
+    def sync(self):
+        """Extracts new/changed documents and rewrites the outputs if anything moved."""
+        from extract_blood_results import write_outputs
+        from manifest import load_manifest, select_lab_documents
+
+        report = RunReport()
+        docs = {}
+        for doc in select_lab_documents(load_manifest(self.manifest_path)):
+            filepath = doc.get('filepath')
+            if filepath and document_exists(self._resolve(filepath)):
+                docs[filepath] = doc
+
+        current = {fp: _document_signature(self._resolve(fp)) for fp in docs}
+        changed = [fp for fp, sig in current.items() if self.signatures.get(fp) != sig]
+        removed = [fp for fp in self.records if fp not in docs]
+        relabeled = [fp for fp in docs if fp in self.records and fp not in changed
+                     and self.records[fp]["metadata"] != docs[fp]]
+        if not changed and not removed and not relabeled:
+            return False
+
+        updated = []
+        for fp in changed:
+            results, _ = extract_cached(self._resolve(fp), self.cache, report)
+            if results:
+                self.records[fp] = {"metadata": docs[fp], "results": results}
+                updated.append(self.records[fp])
+            else:
+                self.records.pop(fp, None)
+        for fp in relabeled:
+            self.records[fp]["metadata"] = docs[fp]
+            updated.append(self.records[fp])
+        for fp in removed:
+            del self.records[fp]
+        self.signatures = current
+
+        all_data = [self.records[fp] for fp in docs if fp in self.records]
+        write_outputs(all_data, out_dir=self.root, report=report)
+        if self.db:
+            from results_store import remove_documents, write_results
+            # A changed file has a new content hash, so its old row would
+            # stay next to the new one
+            if removed or changed:
+                remove_documents(removed + changed, self.db)
+            if updated:
+                write_results(updated, self.db, root=self.root)
+
+        logging.info(f"Updated outputs: {len(changed)} extracted, {len(relabeled)} relabeled, "
+                     f"{len(removed)} removed ({report.counters['cache_hits']} cache hits)")
+        return True
+
+
+def watch(root=".", db=None, cache_dir=DEFAULT_CACHE_DIR, debounce=DEFAULT_DEBOUNCE,
+          poll_interval=DEFAULT_POLL_INTERVAL, force_polling=False):
+    archive_dir = os.path.join(root, "EESZT_Archive")
+    os.makedirs(archive_dir, exist_ok=True)
+    state = ArchiveWatch(root, db, cache_dir)
+    state.sync()
+
+    watcher = make_watcher(archive_dir, state.manifest_path, poll_interval, force_polling)
+    logging.info(f"Watching {archive_dir} ({type(watcher).__name__})")
+    while True:
+        watcher.wait(None)
+        # Debounce: a download is several writes plus a manifest update.
+        while watcher.wait(debounce):
+            pass
+        # Drain before syncing: anything that lands during the sync must
+        # wake us again. Our own output writes (next to manifest.json) do
+        # too, but the follow-up sync finds nothing changed and writes nothing.
+        watcher.drain()
+        try:
+            state.sync()
+        except Exception as e:
+            logging.error(f"Incremental extraction failed: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-extract incrementally as new PDFs land in EESZT_Archive.")
+    parser.add_argument("root", nargs="?", default=".", help="Archive root (manifest.json + EESZT_Archive/)")
+    parser.add_argument("--db", help="Also keep this SQLite store up to date")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, help="Seconds of quiet before extracting")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument("--poll", action="store_true", help="Force the polling watcher")
+    args = parser.parse_args(argv)
+
+    try:
+        watch(args.root, args.db, args.cache_dir, args.debounce, args.poll_interval, args.poll)
+    except KeyboardInterrupt:
+        logging.info("Stopped.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()